@@ -1,8 +1,45 @@
+import re
+from datetime import timedelta
+
 from django.apps import AppConfig
 
+PERIOD_UNITS = {
+    'h': timedelta(hours=1),
+    'd': timedelta(days=1),
+    'w': timedelta(weeks=1),
+    'm': timedelta(days=30),
+    'y': timedelta(days=365),
+}
+
+
+def parse_period(period: str) -> timedelta:
+    """
+    Parse period like '12h', '1d', '2w', '1m' (month), '1y'.
+    """
+    match = re.fullmatch(r'(\d+)([hdwmy])', period.strip())
+    if not match:
+        raise ValueError(f'Incorrect period: {period!r}')
+
+    count, unit = match.groups()
+    return int(count) * PERIOD_UNITS[unit]
+
 
 class CacheAddressAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cache_address_app'
 
+    # cached address is returned as is after this period, but will be geocoded again in background
     requre_update_after = '1m'
+    # the same for addresses which were not found by geocoder
+    requre_invalid_update_after = '1d'
+
+    def ready(self):
+        from cache_address_app import signals  # noqa: F401
+
+    @property
+    def update_after(self) -> timedelta:
+        return parse_period(self.requre_update_after)
+
+    @property
+    def invalid_update_after(self) -> timedelta:
+        return parse_period(self.requre_invalid_update_after)
@@ -0,0 +1,161 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from functools import wraps
+from threading import Lock, get_ident
+
+from django.conf import settings
+from django.db import connection
+
+
+def close_db_connection_after(func):
+    """
+    Close thread's own DB connection after call. Django opens a new connection for each thread,
+    so worker threads must close them by themselves.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connection.close()
+
+    return wrapper
+
+
+def return_exceptions(func):
+    """
+    Return exception raised by func instead of raising it, so failure of one item does not lose results of others.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as error:
+            return error
+
+    return wrapper
+
+
+def map_in_threads(func, items, max_workers: int, catch_exceptions: bool = False) -> dict:
+    """
+    Call func for each item on bounded thread pool.
+
+    :param func: callable with one argument
+    :param items: iterable of hashable items
+    :param max_workers: max count of threads
+    :param catch_exceptions: return exceptions of failed calls as their results instead of raising the first one
+    :return: dict {item: func(item)}
+    """
+    items = list(items)
+
+    if not items:
+        return {}
+
+    if catch_exceptions:
+        func = return_exceptions(func)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        results = executor.map(close_db_connection_after(func), items)
+        return dict(zip(items, results))
+
+
+_background_executor = None
+_background_executor_lock = Lock()
+
+
+def submit_background(func, *args, **kwargs) -> Future:
+    """
+    Run func on shared bounded thread pool without waiting for result.
+    Pool size is settings.GEOCODER_MAX_WORKERS.
+    """
+    global _background_executor
+
+    with _background_executor_lock:
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(
+                max_workers=settings.GEOCODER_MAX_WORKERS,
+                thread_name_prefix='background',
+            )
+
+    return _background_executor.submit(close_db_connection_after(func), *args, **kwargs)
+
+
+def map_in_background(func, items, timeout: float, catch_exceptions: bool = False) -> dict:
+    """
+    Call func for each item on shared background thread pool and wait for results not longer than timeout.
+    Calls which are not finished in time are not cancelled, they are finished in background.
+
+    :param func: callable with one argument
+    :param items: iterable of hashable items
+    :param timeout: max time of waiting in seconds
+    :param catch_exceptions: return exceptions of failed calls as their results instead of raising the first one
+    :return: dict {item: func(item)} only for finished calls
+    """
+    if catch_exceptions:
+        func = return_exceptions(func)
+
+    futures = {submit_background(func, item): item for item in items}
+
+    if not futures:
+        return {}
+
+    done, _ = wait(futures, timeout=timeout)
+    return {futures[future]: future.result() for future in done}
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter of calls per second. wait() blocks caller until the next call is allowed.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0
+        self._next_call = time.monotonic()
+        self._lock = Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            call_at = max(now, self._next_call)
+            self._next_call = call_at + self.interval
+
+        if call_at > now:
+            time.sleep(call_at - now)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key: the first caller does the call,
+    the others wait for its result or exception in this process.
+    Nested call with the same key in the thread of the first caller is made directly, it would wait for itself.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future, leader = self._calls.get(key, (None, None))
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._calls[key] = (future, get_ident())
+
+        if leader == get_ident():
+            return func(*args, **kwargs)
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
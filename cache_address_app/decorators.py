@@ -1,25 +1,247 @@
+import logging
+import time
+from datetime import timedelta
 from functools import wraps
+from threading import Lock
 
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+from cache_address_app.concurrency import map_in_threads, map_in_background, submit_background, SingleFlight
+from cache_address_app.memory_cache import geodata_cache, MISSING
 from cache_address_app.models import CachedAddress
+from cache_address_app.normalization import get_address_hash
+
+logger = logging.getLogger(__name__)
+
+LOCK_POLL_INTERVAL = 0.1
+
+
+def get_geodata(cached_address: CachedAddress):
+    return (cached_address.lng, cached_address.lat) if cached_address.valid else None
+
+
+def is_expired(cached_address: CachedAddress) -> bool:
+    config = apps.get_app_config('cache_address_app')
+    update_after = config.update_after if cached_address.valid else config.invalid_update_after
+    return cached_address.last_update + update_after < timezone.now()
+
+
+def get_lock_deadline():
+    return timezone.now() + timedelta(seconds=settings.GEOCODER_LOCK_TIMEOUT)
+
+
+def wait_for_unlock(cached_address: CachedAddress):
+    """
+    Wait while address is geocoded by another process.
+    :return: fresh cached_address, which is still locked when lock is expired, or None, when geocoding failed
+    """
+    while cached_address.locked_until and cached_address.locked_until > timezone.now():
+        time.sleep(LOCK_POLL_INTERVAL)
+        cached_address = CachedAddress.objects.filter(pk=cached_address.pk).first()
+
+        if cached_address is None:
+            return None
+
+    return cached_address
 
 
 def use_db_cache(func):
+    """
+    Cache results of geocoder function in CachedAddress table. The table is looked up by hash of normalized address,
+    and the first seen original spelling of the address is stored and passed to geocoder.
+    In-process memory cache is used in front of the table, negative results are cached too.
+    Expired entries are returned as is and geocoded again in background (stale-while-revalidate).
+
+    Every address is geocoded once at a time: concurrent calls in a process are coalesced,
+    and other processes wait for the locked placeholder row inserted by the process which geocodes.
+    """
+    refreshing = set()
+    refreshing_lock = Lock()
+    single_flight = SingleFlight()
+
+    def geocode_locked(api_key: str, cached_address: CachedAddress):
+        """
+        Geocode address of the placeholder row locked by this process and store the result.
+        """
+        try:
+            geodata = func(api_key, cached_address.address)
+        except Exception:
+            # remove the placeholder, so waiting processes stop waiting and the address will be geocoded again
+            CachedAddress.objects.filter(pk=cached_address.pk, locked_until=cached_address.locked_until).delete()
+            raise
+
+        lng, lat = geodata or (None, None)
+        CachedAddress.objects.filter(pk=cached_address.pk).update(
+            lng=lng,
+            lat=lat,
+            valid=bool(geodata),
+            locked_until=None,
+            last_update=timezone.now(),
+        )
+
+        geodata = (lng, lat) if geodata else None
+        geodata_cache.set(cached_address.address_hash, geodata)
+        return geodata
+
+    def fetch_once(api_key: str, address: str, address_hash: str):
+        cached_address, created = CachedAddress.objects.get_or_create(
+            address_hash=address_hash,
+            defaults={
+                'address': address,
+                'locked_until': get_lock_deadline(),
+            },
+        )
+
+        if created:
+            return geocode_locked(api_key, cached_address)
+
+        return from_db_cache(api_key, cached_address)
+
+    def fetch_and_cache(api_key: str, address: str):
+        address_hash = get_address_hash(address)
+        return single_flight.do(address_hash, fetch_once, api_key, address, address_hash)
+
+    def refresh(api_key: str, cached_address: CachedAddress):
+        claimed_at = timezone.now()
+        try:
+            # touch the row first, so the address is refreshed by one process only
+            claimed = CachedAddress.objects.filter(
+                pk=cached_address.pk,
+                last_update=cached_address.last_update,
+            ).update(last_update=claimed_at)
+            if not claimed:
+                return
+
+            try:
+                geodata = func(api_key, cached_address.address)
+            except Exception:
+                # the row is expired again, so the address is refreshed by the next read
+                CachedAddress.objects.filter(
+                    pk=cached_address.pk,
+                    last_update=claimed_at,
+                ).update(last_update=cached_address.last_update)
+                raise
+
+            lng, lat = geodata or (None, None)
+            CachedAddress.objects.filter(pk=cached_address.pk).update(
+                lng=lng,
+                lat=lat,
+                valid=bool(geodata),
+                last_update=timezone.now(),
+            )
+            geodata_cache.set(cached_address.address_hash, (lng, lat) if geodata else None)
+        except Exception:
+            logger.exception('Background refresh of address %r failed', cached_address.address)
+        finally:
+            with refreshing_lock:
+                refreshing.discard(cached_address.address_hash)
+
+    def from_db_cache(api_key: str, cached_address: CachedAddress):
+        if cached_address.locked_until:
+            locked_until = cached_address.locked_until
+            cached_address = wait_for_unlock(cached_address)
+
+            if cached_address is None:
+                return None
+
+            if cached_address.locked_until:
+                # process which locked the row has died, take the lock over
+                deadline = get_lock_deadline()
+                taken = CachedAddress.objects.filter(
+                    pk=cached_address.pk,
+                    locked_until=locked_until,
+                ).update(locked_until=deadline)
+
+                if not taken:
+                    # another process has taken the lock over, and it can remove the placeholder on failure
+                    taken_address = CachedAddress.objects.filter(pk=cached_address.pk).first()
+                    if taken_address is None:
+                        return fetch_and_cache(api_key, cached_address.address)
+
+                    return from_db_cache(api_key, taken_address)
+
+                cached_address.locked_until = deadline
+                return geocode_locked(api_key, cached_address)
+
+        if is_expired(cached_address):
+            with refreshing_lock:
+                scheduled = cached_address.address_hash in refreshing
+                refreshing.add(cached_address.address_hash)
+
+            if not scheduled:
+                submit_background(refresh, api_key, cached_address)
+
+        geodata = get_geodata(cached_address)
+        geodata_cache.set(cached_address.address_hash, geodata)
+        return geodata
+
     @wraps(func)
     def with_cache(api_key: str, address: str):
-        address = address.upper()
+        address_hash = get_address_hash(address)
+
+        geodata = geodata_cache.get(address_hash)
+        if geodata is not MISSING:
+            return geodata
 
         try:
-            cached_address = CachedAddress.objects.get(address=address)
-            return cached_address.lng, cached_address.lat if cached_address.valid else None
+            cached_address = CachedAddress.objects.get(address_hash=address_hash)
         except CachedAddress.DoesNotExist:
-            geodata = func(api_key, address)
-
-            if geodata:
-                lng, lat = geodata
-                CachedAddress.objects.create(address=address, lng=lng, lat=lat, valid=True)
-                return lng, lat
-            else:
-                CachedAddress.objects.create(address=address, valid=False)
-                return
+            return fetch_and_cache(api_key, address)
+
+        return from_db_cache(api_key, cached_address)
+
+    def fetch_many(api_key: str, addresses, max_workers: int = None, timeout: float = None,
+                   catch_exceptions: bool = False) -> dict:
+        """
+        Batch version of decorated function. Cached addresses are selected by one query,
+        missed addresses are fetched concurrently on bounded thread pool.
+
+        :param api_key: API key for decorated function
+        :param addresses: iterable of addresses
+        :param max_workers: max count of concurrent fetches, settings.GEOCODER_MAX_WORKERS by default
+        :param timeout: max time of waiting for missed addresses in seconds, unlimited by default.
+            Addresses which are not fetched in time are absent in result, they are fetched and cached in background
+        :param catch_exceptions: return exceptions of failed addresses as their results, so one failed address
+            does not fail the others, the first exception is raised by default
+        :return: dict {address: geodata or None} for every passed address
+        """
+        keys = {address: get_address_hash(address) for address in addresses}
+        addresses_by_key = {key: address for address, key in keys.items()}
+
+        found = {}
+        for key in addresses_by_key:
+            geodata = geodata_cache.get(key)
+            if geodata is not MISSING:
+                found[key] = geodata
+
+        not_in_memory = addresses_by_key.keys() - found.keys()
+        if not_in_memory:
+            # locked addresses are geocoded by another process now, they are waited on the pool as missed ones
+            cached_addresses = CachedAddress.objects.filter(address_hash__in=not_in_memory, locked_until__isnull=True)
+            for cached_address in cached_addresses:
+                found[cached_address.address_hash] = from_db_cache(api_key, cached_address)
+
+        missed = addresses_by_key.keys() - found.keys()
+        if timeout is None:
+            fetched = map_in_threads(
+                lambda key: fetch_and_cache(api_key, addresses_by_key[key]),
+                missed,
+                max_workers=max_workers or settings.GEOCODER_MAX_WORKERS,
+                catch_exceptions=catch_exceptions,
+            )
+        else:
+            fetched = map_in_background(
+                lambda key: fetch_and_cache(api_key, addresses_by_key[key]),
+                missed,
+                timeout=timeout,
+                catch_exceptions=catch_exceptions,
+            )
+        found.update(fetched)
+
+        return {address: found[key] for address, key in keys.items() if key in found}
 
+    with_cache.fetch_many = fetch_many
+    with_cache.memory_cache = geodata_cache
     return with_cache
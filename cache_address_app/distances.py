@@ -0,0 +1,68 @@
+import hashlib
+
+from cache_address_app.models import CachedDistance
+
+# pairs are looked up by batches, so IN clause does not exceed limit of query parameters, e.g. 999 in SQLite
+LOOKUP_BATCH_SIZE = 500
+
+
+def get_point_key(point) -> str:
+    lat, lng = point
+    return f'{float(lat):.5f},{float(lng):.5f}'
+
+
+def get_pair_hash(source_key: str, destination_key: str, method: str) -> str:
+    return hashlib.blake2b(f'{method}:{source_key}:{destination_key}'.encode(), digest_size=16).hexdigest()
+
+
+def get_cached_distances(pairs, method: str, evaluate) -> dict:
+    """
+    Get distances between pairs of points from CachedDistance table by one query per LOOKUP_BATCH_SIZE pairs,
+    missed distances are evaluated and saved to the table.
+    Points are tuples (lat, lng) rounded to 5 decimal places, about one meter, for keys.
+
+    :param pairs: iterable of tuples (source point, destination point)
+    :param method: name of evaluation method, distances of different methods are cached separately
+    :param evaluate: callable, takes list of missed pairs and returns list of distances in kilometers
+    :return: dict {(source point, destination point): distance in kilometers}
+    """
+    keys = {
+        pair: (get_point_key(pair[0]), get_point_key(pair[1]))
+        for pair in pairs
+    }
+    hashes = {
+        get_pair_hash(source_key, destination_key, method): pair
+        for pair, (source_key, destination_key) in keys.items()
+    }
+
+    distances = {}
+    pair_hashes = list(hashes)
+    for start in range(0, len(pair_hashes), LOOKUP_BATCH_SIZE):
+        cached_distances = CachedDistance.objects.filter(
+            pair_hash__in=pair_hashes[start:start + LOOKUP_BATCH_SIZE],
+        ).values_list('pair_hash', 'distance_km')
+        distances.update((hashes[pair_hash], distance_km) for pair_hash, distance_km in cached_distances)
+
+    missed = [pair for pair in keys if pair not in distances]
+    if not missed:
+        return distances
+
+    evaluated_distances = dict(zip(missed, evaluate(missed)))
+    distances.update(evaluated_distances)
+
+    CachedDistance.objects.bulk_create(
+        [
+            CachedDistance(
+                pair_hash=get_pair_hash(*keys[pair], method),
+                source=keys[pair][0],
+                destination=keys[pair][1],
+                method=method,
+                distance_km=distance_km,
+            )
+            for pair, distance_km in evaluated_distances.items()
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+    return distances
@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+
+MISSING = object()
+
+
+class TTLLRUCache:
+    """
+    Thread-safe in-process cache with bounded size and time to live of entries.
+    None is a regular value, so negative results are cached too. Missed key is reported by MISSING.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key, MISSING)
+
+            if entry is MISSING or entry[1] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+geodata_cache = TTLLRUCache(
+    maxsize=settings.GEOCODER_MEMORY_CACHE_SIZE,
+    ttl=settings.GEOCODER_MEMORY_CACHE_TTL,
+)
@@ -0,0 +1,87 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:30
+
+import hashlib
+import re
+
+from django.db import migrations, models
+
+# copy of cache_address_app.normalization at the time of the migration, later changes of normalization
+# must not change the history
+ABBREVIATIONS = {
+    'обл': 'область',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пер': 'переулок',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'пл': 'площадь',
+    'наб': 'набережная',
+    'мкр': 'микрорайон',
+    'корп': 'корпус',
+    'стр': 'строение',
+}
+
+NOT_ADDRESS_CHARACTERS = re.compile(r'[^\w\-/]+')
+
+
+def normalize_address(address):
+    address = address.casefold().replace('ё', 'е')
+    words = NOT_ADDRESS_CHARACTERS.sub(' ', address).split()
+
+    return ' '.join(
+        ABBREVIATIONS.get(word, word)
+        for word in words
+        if word.strip('-/')
+    )
+
+
+def get_address_hash(address):
+    return hashlib.blake2b(normalize_address(address).encode(), digest_size=16).hexdigest()
+
+
+def normalize_cached_addresses(apps, schema_editor):
+    CachedAddress = apps.get_model('cache_address_app', 'CachedAddress')
+
+    seen_hashes = set()
+    duplicates = []
+    # valid and fresh entries win when several addresses have the same normalized form
+    for cached_address in CachedAddress.objects.order_by('-valid', '-last_update').iterator():
+        address_hash = get_address_hash(cached_address.address)
+
+        if address_hash in seen_hashes:
+            duplicates.append(cached_address.pk)
+            continue
+
+        seen_hashes.add(address_hash)
+        # the original address is kept, it is sent to geocoder on refresh
+        CachedAddress.objects.filter(pk=cached_address.pk).update(address_hash=address_hash)
+
+    CachedAddress.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cache_address_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedaddress',
+            name='address_hash',
+            field=models.CharField(max_length=32, null=True, verbose_name='Хэш нормализованного адреса'),
+        ),
+        migrations.RunPython(normalize_cached_addresses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cachedaddress',
+            name='address_hash',
+            field=models.CharField(max_length=32, unique=True, verbose_name='Хэш нормализованного адреса'),
+        ),
+        migrations.AlterField(
+            model_name='cachedaddress',
+            name='address',
+            field=models.TextField(verbose_name='Адрес'),
+        ),
+    ]
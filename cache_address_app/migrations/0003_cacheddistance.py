@@ -0,0 +1,26 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cache_address_app', '0002_normalized_address_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedDistance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pair_hash', models.CharField(max_length=32, unique=True, verbose_name='Хэш пары точек и метода')),
+                ('source', models.CharField(max_length=50, verbose_name='Откуда')),
+                ('destination', models.CharField(max_length=50, verbose_name='Куда')),
+                ('method', models.CharField(max_length=30, verbose_name='Метод расчёта')),
+                ('distance_km', models.FloatField(verbose_name='Расстояние, км')),
+                ('duration', models.DurationField(blank=True, null=True, verbose_name='Время в пути')),
+                ('last_update', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cache_address_app', '0003_cacheddistance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedaddress',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, help_text='Адрес геокодируется другим процессом, результат будет сохранён до этого времени', null=True, verbose_name='Геокодируется до'),
+        ),
+    ]
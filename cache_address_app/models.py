@@ -6,7 +6,11 @@ class CachedAddress(models.Model):
     address = models.TextField(
         verbose_name='Адрес',
         blank=False,
-        db_index=True,
+    )
+
+    address_hash = models.CharField(
+        verbose_name='Хэш нормализованного адреса',
+        max_length=32,
         unique=True,
     )
 
@@ -43,5 +47,51 @@ class CachedAddress(models.Model):
         default=False,
     )
 
+    locked_until = models.DateTimeField(
+        verbose_name='Геокодируется до',
+        help_text='Адрес геокодируется другим процессом, результат будет сохранён до этого времени',
+        null=True, blank=True,
+    )
+
     def __str__(self):
         return self.address
+
+
+class CachedDistance(models.Model):
+    pair_hash = models.CharField(
+        verbose_name='Хэш пары точек и метода',
+        max_length=32,
+        unique=True,
+    )
+
+    source = models.CharField(
+        verbose_name='Откуда',
+        max_length=50,
+    )
+
+    destination = models.CharField(
+        verbose_name='Куда',
+        max_length=50,
+    )
+
+    method = models.CharField(
+        verbose_name='Метод расчёта',
+        max_length=30,
+    )
+
+    distance_km = models.FloatField(
+        verbose_name='Расстояние, км',
+    )
+
+    duration = models.DurationField(
+        verbose_name='Время в пути',
+        null=True, blank=True,
+    )
+
+    last_update = models.DateTimeField(
+        verbose_name='Дата обновления',
+        auto_now=True,
+    )
+
+    def __str__(self):
+        return f'{self.source} - {self.destination} ({self.method}): {self.distance_km} км'
@@ -0,0 +1,45 @@
+import hashlib
+import re
+
+# only unambiguous abbreviations are expanded: "пр" is used for both проспект and проезд,
+# and single letters like "г", "д" and "к" are also letters of house numbers, e.g. "д. 10 г"
+ABBREVIATIONS = {
+    'обл': 'область',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'пр-кт': 'проспект',
+    'просп': 'проспект',
+    'пер': 'переулок',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'пл': 'площадь',
+    'наб': 'набережная',
+    'мкр': 'микрорайон',
+    'корп': 'корпус',
+    'стр': 'строение',
+}
+
+NOT_ADDRESS_CHARACTERS = re.compile(r'[^\w\-/]+')
+
+
+def normalize_address(address: str) -> str:
+    """
+    Canonical form of address for cache key: casefolded, without punctuation and repeated whitespaces,
+    with expanded common abbreviations. "Москва, ул. Ленина 10" and "москва  улица ленина, 10" are the same.
+    Geocoder gets the original address, normalization can lose details which geocoder understands.
+    """
+    address = address.casefold().replace('ё', 'е')
+    words = NOT_ADDRESS_CHARACTERS.sub(' ', address).split()
+
+    return ' '.join(
+        ABBREVIATIONS.get(word, word)
+        for word in words
+        if word.strip('-/')
+    )
+
+
+def get_address_hash(address: str) -> str:
+    """
+    Fixed-width key of normalized address for cache index.
+    """
+    return hashlib.blake2b(normalize_address(address).encode(), digest_size=16).hexdigest()
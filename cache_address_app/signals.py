@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from cache_address_app.memory_cache import geodata_cache
+from cache_address_app.models import CachedAddress
+
+
+@receiver(post_save, sender=CachedAddress)
+@receiver(post_delete, sender=CachedAddress)
+def invalidate_memory_cache(sender, instance, **kwargs):
+    geodata_cache.invalidate(instance.address_hash)
@@ -1,3 +1,191 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from cache_address_app.concurrency import SingleFlight
+from cache_address_app.decorators import use_db_cache
+from cache_address_app.memory_cache import MISSING, TTLLRUCache, geodata_cache
+from cache_address_app.models import CachedAddress
+from cache_address_app.normalization import get_address_hash, normalize_address
+
+
+class NormalizeAddressTest(SimpleTestCase):
+    def test_spellings_of_the_same_address(self):
+        self.assertEqual(normalize_address('Москва, ул. Ленина 10'), normalize_address('москва  улица ленина, 10'))
+        self.assertEqual(get_address_hash('Пр-т Мира, 1'), get_address_hash('проспект мира 1'))
+        self.assertEqual(normalize_address('Щёлковское шоссе'), 'щелковское шоссе')
+
+    def test_ambiguous_abbreviations_are_kept(self):
+        self.assertEqual(normalize_address('3-й Автозаводский пр.'), '3-й автозаводский пр')
+        self.assertEqual(normalize_address('д. 10 г'), 'д 10 г')
+
+
+class NormalizedAddressHashMigrationTest(TransactionTestCase):
+    migrate_from = [('cache_address_app', '0001_initial')]
+    migrate_to = [('cache_address_app', '0002_normalized_address_hash')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_original_addresses_are_kept(self):
+        apps = self.migrate(self.migrate_from)
+        CachedAddress = apps.get_model('cache_address_app', 'CachedAddress')
+        CachedAddress.objects.create(address='Москва, ул. Ленина 10', valid=False)
+        CachedAddress.objects.create(address='москва  улица ленина, 10', valid=True)
+        CachedAddress.objects.create(address='Пр-т Мира, 1', valid=True)
+
+        apps = self.migrate(self.migrate_to)
+        CachedAddress = apps.get_model('cache_address_app', 'CachedAddress')
+
+        self.assertCountEqual(
+            CachedAddress.objects.values_list('address', 'address_hash'),
+            [
+                ('москва  улица ленина, 10', get_address_hash('Москва, ул. Ленина 10')),
+                ('Пр-т Мира, 1', get_address_hash('проспект мира 1')),
+            ],
+        )
+
+
+class SingleFlightTest(SimpleTestCase):
+    def test_concurrent_calls_are_coalesced(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_call():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'result'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(single_flight.do('key', slow_call)))
+        leader.start()
+        started.wait(5)
+
+        followers = [
+            threading.Thread(target=lambda: results.append(single_flight.do('key', slow_call)))
+            for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ['result'] * 4)
+
+    def test_exception_is_raised_and_next_call_is_made(self):
+        single_flight = SingleFlight()
+
+        with self.assertRaises(ValueError):
+            single_flight.do('key', mock.Mock(side_effect=ValueError))
+        self.assertEqual(single_flight.do('key', lambda: 'retried'), 'retried')
+
+    def test_nested_call_of_leader_is_made(self):
+        single_flight = SingleFlight()
+
+        result = single_flight.do('key', lambda: single_flight.do('key', lambda: 'nested'))
+        self.assertEqual(result, 'nested')
+        self.assertEqual(single_flight.do('key', lambda: 'next'), 'next')
+
+
+class PlaceholderLockTest(TestCase):
+    address = 'Москва, ул. Ленина 10'
+
+    def setUp(self):
+        geodata_cache.clear()
+        self.addCleanup(geodata_cache.clear)
+        self.geocoder = mock.Mock(return_value=(37.6, 55.7))
+        self.geocode = use_db_cache(self.geocoder)
+
+    def create_placeholder(self, locked_until) -> CachedAddress:
+        return CachedAddress.objects.create(
+            address=self.address,
+            address_hash=get_address_hash(self.address),
+            locked_until=locked_until,
+        )
+
+    def test_placeholder_is_unlocked_after_geocoding(self):
+        self.assertEqual(self.geocode('key', self.address), (37.6, 55.7))
+
+        cached_address = CachedAddress.objects.get()
+        self.assertIsNone(cached_address.locked_until)
+        self.assertTrue(cached_address.valid)
+
+    def test_placeholder_is_removed_when_geocoding_fails(self):
+        self.geocoder.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            self.geocode('key', self.address)
+
+        self.assertFalse(CachedAddress.objects.exists())
+
+    def test_expired_lock_is_taken_over(self):
+        self.create_placeholder(timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.geocode('key', 'москва улица ленина 10'), (37.6, 55.7))
+        self.geocoder.assert_called_once_with('key', self.address)
+        self.assertIsNone(CachedAddress.objects.get().locked_until)
+
+    def test_address_is_fetched_when_lost_takeover_removed_placeholder(self):
+        placeholder = self.create_placeholder(timezone.now() - timedelta(seconds=1))
+
+        def wait_for_unlock(cached_address):
+            # another process takes the lock over and removes the placeholder after failure
+            CachedAddress.objects.filter(pk=placeholder.pk).delete()
+            return cached_address
+
+        with mock.patch('cache_address_app.decorators.wait_for_unlock', wait_for_unlock):
+            self.assertEqual(self.geocode('key', self.address), (37.6, 55.7))
+
+        self.assertIsNone(CachedAddress.objects.get().locked_until)
+
+
+class TTLLRUCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch('cache_address_app.memory_cache.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_none_is_cached(self):
+        cache = TTLLRUCache(maxsize=2, ttl=10)
+        cache.set('address', None)
+
+        self.assertIsNone(cache.get('address'))
+        self.assertIs(cache.get('other'), MISSING)
+
+    def test_entries_expire(self):
+        cache = TTLLRUCache(maxsize=2, ttl=10)
+        cache.set('address', (37.6, 55.7))
+
+        self.now += 9
+        self.assertEqual(cache.get('address'), (37.6, 55.7))
+        self.now += 2
+        self.assertIs(cache.get('address'), MISSING)
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLLRUCache(maxsize=2, ttl=10)
+        cache.set('first', 1)
+        cache.set('second', 2)
+        cache.get('first')
+        cache.set('third', 3)
+
+        self.assertEqual(cache.get('first'), 1)
+        self.assertIs(cache.get('second'), MISSING)
+        self.assertEqual(cache.get('third'), 3)
+        self.assertEqual(cache.stats()['size'], 2)
@@ -1,10 +1,15 @@
+from functools import partial
+
 from django.contrib import admin
+from django.db import transaction
 from django.http import HttpResponseRedirect
 from django.shortcuts import reverse
 from django.templatetags.static import static
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
 
 from .forms import OrderAdminForm
+from .geo_tools import get_distances, schedule_orders_geocoding
 from .models import Product, Order, ProductOrderQuantity
 from .models import ProductCategory
 from .models import Restaurant
@@ -27,6 +32,13 @@ class RestaurantAdmin(admin.ModelAdmin):
         'name',
         'address',
         'contact_phone',
+        'active_orders_count',
+        'max_active_orders',
+    ]
+    readonly_fields = [
+        'lat',
+        'lng',
+        'active_orders_count',
     ]
     inlines = [
         RestaurantMenuItemInline
@@ -149,7 +161,9 @@ class OrderAdmin(admin.ModelAdmin):
         ProductOrderQuantityInline,
     ]
 
-    readonly_fields = ['view_cost', 'created_at']
+    readonly_fields = ['view_cost', 'created_at', 'lat', 'lng', 'geocode_status', 'view_nearest_restaurants']
+
+    nearest_restaurants_count = 5
 
     def get_queryset(self, request):
         return Order.objects.with_cost()
@@ -158,6 +172,34 @@ class OrderAdmin(admin.ModelAdmin):
     def view_cost(self, order):
         return order.cost
 
+    @admin.display(description='ближайшие рестораны')
+    def view_nearest_restaurants(self, order):
+        if not order.pk or not order.coordinates:
+            return '—'
+
+        nearest_restaurants = get_distances(
+            order,
+            order.get_appropriate_restaurants(),
+            sort=True,
+            k=self.nearest_restaurants_count,
+        )
+        return format_html_join(
+            mark_safe('<br>'),
+            '{} — {} км',
+            ((restaurant.name, f'{distance:.1f}') for restaurant, distance in nearest_restaurants),
+        ) or '—'
+
+    def save_model(self, request, obj, form, change):
+        address_changed = 'address' in form.changed_data
+        if address_changed:
+            obj.lat, obj.lng = None, None
+            obj.geocode_status = Order.GeocodeStatus.PENDING
+
+        super(OrderAdmin, self).save_model(request, obj, form, change)
+
+        if address_changed:
+            transaction.on_commit(partial(schedule_orders_geocoding, [obj.pk]))
+
     def save_formset(self, request, form, formset, change):
         """
         Update frozen_price in form like actual product price
@@ -0,0 +1,130 @@
+"""
+In-memory index of products available in restaurants.
+
+Every restaurant is mapped to bitset of its available products, where bit number is primary key of product.
+Restaurant can prepare the order, when products of the order are subset of the restaurant products,
+so matching of order and restaurant is one AND of two integers and no SQL query is needed.
+"""
+import time
+from threading import Lock
+
+from django.conf import settings
+
+
+def to_bitset(product_pks) -> int:
+    bitset = 0
+    for product_pk in product_pks:
+        bitset |= 1 << product_pk
+    return bitset
+
+
+class AvailabilityIndex:
+    def __init__(self, menu_items):
+        """
+        :param menu_items: iterable of tuples (restaurant_pk, product_pk) of available menu items
+        """
+        self.restaurants = {}
+
+        for restaurant_pk, product_pk in menu_items:
+            self.restaurants[restaurant_pk] = self.restaurants.get(restaurant_pk, 0) | 1 << product_pk
+
+    def __len__(self):
+        return len(self.restaurants)
+
+    def set_availability(self, restaurant_pk: int, product_pk: int, available: bool):
+        bitset = self.restaurants.get(restaurant_pk, 0)
+        if available:
+            bitset |= 1 << product_pk
+        else:
+            bitset &= ~(1 << product_pk)
+
+        if bitset:
+            self.restaurants[restaurant_pk] = bitset
+        else:
+            self.restaurants.pop(restaurant_pk, None)
+
+    def remove_restaurant(self, restaurant_pk: int):
+        self.restaurants.pop(restaurant_pk, None)
+
+    def find_restaurants(self, product_pks) -> list:
+        """
+        :param product_pks: primary keys of ordered products
+        :return: primary keys of restaurants, where all the products are available.
+            Nothing is found for empty list of products
+        """
+        required = to_bitset(product_pks)
+        if not required:
+            return []
+
+        return [
+            restaurant_pk for restaurant_pk, available in self.restaurants.items()
+            if required & available == required
+        ]
+
+
+_availability_index = None
+_availability_index_built_at = None
+_availability_index_lock = Lock()
+
+
+def get_availability_index() -> AvailabilityIndex:
+    """
+    Availability index of all restaurants. Index is patched by changes of menu items in current process
+    and rebuilt every settings.AVAILABILITY_INDEX_TTL seconds for changes made by other processes.
+    """
+    global _availability_index, _availability_index_built_at
+    from foodcartapp.models import RestaurantMenuItem
+
+    with _availability_index_lock:
+        expired = _availability_index_built_at is None or \
+            _availability_index_built_at + settings.AVAILABILITY_INDEX_TTL < time.monotonic()
+
+        if _availability_index is None or expired:
+            menu_items = RestaurantMenuItem.objects.filter(availability=True).values_list('restaurant', 'product')
+            _availability_index = AvailabilityIndex(menu_items)
+            _availability_index_built_at = time.monotonic()
+
+        return _availability_index
+
+
+def update_availability_index(restaurant_pk: int, product_pk: int, available: bool):
+    """
+    Patch the index by changed menu item. Index which is not built yet is left as is.
+    """
+    with _availability_index_lock:
+        if _availability_index is not None:
+            _availability_index.set_availability(restaurant_pk, product_pk, available)
+
+
+def remove_from_availability_index(restaurant_pk: int):
+    with _availability_index_lock:
+        if _availability_index is not None:
+            _availability_index.remove_restaurant(restaurant_pk)
+
+
+def refresh_availability_index(menu_items):
+    """
+    Patch the index by menu items read from the database, for bulk changes where saved values are not known.
+    Menu items which are not found anymore are not available.
+    :param menu_items: iterable of tuples (restaurant_pk, product_pk) of changed menu items
+    """
+    from foodcartapp.models import RestaurantMenuItem
+
+    menu_items = set(menu_items)
+    if _availability_index is None or not menu_items:
+        return
+
+    available_items = set(
+        RestaurantMenuItem.objects.filter(
+            availability=True,
+            restaurant__in={restaurant_pk for restaurant_pk, _ in menu_items},
+            product__in={product_pk for _, product_pk in menu_items},
+        ).values_list('restaurant', 'product')
+    )
+
+    with _availability_index_lock:
+        if _availability_index is not None:
+            for restaurant_pk, product_pk in menu_items:
+                _availability_index.set_availability(
+                    restaurant_pk, product_pk, (restaurant_pk, product_pk) in available_items,
+                )
@@ -0,0 +1,160 @@
+"""
+Materialized candidate restaurants of open orders.
+
+Every open order is stored with restaurants which can prepare it and distances to them,
+so the order board reads one table. Rows are updated after changes of orders, their lines,
+menu items and restaurants, only rows of the changed order or restaurant are replaced.
+Rows of finished and canceled orders are removed.
+"""
+from collections import defaultdict
+from threading import local
+
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, F, Q
+
+from foodcartapp.geo_tools import get_many_distances
+from foodcartapp.models import Order, OrderCandidateRestaurant
+
+
+CLOSED_STATUSES = (Order.Status.FINISHED, Order.Status.CANCELED)
+
+
+def get_open_orders():
+    return Order.objects.exclude(status__in=CLOSED_STATUSES)
+
+
+def remove_closed_orders_candidates(order_pks=None):
+    """
+    :param order_pks: remove rows of these orders, when they are closed, rows of all closed orders by default
+    :return: count of removed rows
+    """
+    candidates = OrderCandidateRestaurant.objects.filter(order__status__in=CLOSED_STATUSES)
+    if order_pks is not None:
+        candidates = candidates.filter(order__in=list(order_pks))
+
+    removed, _ = candidates.delete()
+    return removed
+
+
+def update_candidates(orders, restaurant_pks=None):
+    """
+    Select restaurants which can prepare the orders, evaluate distances and replace stored rows.
+    :param orders: iterable of orders with coordinates
+    :param restaurant_pks: replace rows of these restaurants only, all rows of the orders by default
+    """
+    orders = list(orders)
+    order_pks = [order.pk for order in orders]
+    if not order_pks:
+        return
+
+    appropriate_restaurants = Order.get_many_orders_appropriate_restaurants(Order.objects.filter(pk__in=order_pks))
+    if restaurant_pks is not None:
+        appropriate_restaurants = appropriate_restaurants.filter(pk__in=restaurant_pks)
+
+    mapped_restaurants = defaultdict(list)
+    for restaurant in appropriate_restaurants:
+        mapped_restaurants[restaurant.order_pk].append(restaurant)
+
+    orders_distances = get_many_distances(orders, mapped_restaurants)
+
+    candidates = [
+        OrderCandidateRestaurant(order_id=order_pk, restaurant=restaurant, distance_km=distance_km)
+        for order_pk, distances in orders_distances.items()
+        for restaurant, distance_km in distances
+    ]
+
+    stored_candidates = OrderCandidateRestaurant.objects.filter(order__in=order_pks)
+    if restaurant_pks is not None:
+        stored_candidates = stored_candidates.filter(restaurant__in=restaurant_pks)
+
+    with transaction.atomic():
+        stored_candidates.delete()
+        OrderCandidateRestaurant.objects.bulk_create(candidates, batch_size=500, ignore_conflicts=True)
+
+
+def update_orders_candidates(order_pks):
+    """
+    Replace all candidates of open orders, call it after creation, geocoding or change of lines of orders.
+    """
+    update_candidates(get_open_orders().filter(pk__in=list(order_pks)).only('lat', 'lng'))
+
+
+def update_restaurants_candidates(restaurant_pks, product_pks=None):
+    """
+    Replace rows of changed restaurants.
+    :param restaurant_pks: primary keys of changed restaurants
+    :param product_pks: products which availability is changed, open orders with these products are updated.
+        Only distances of already stored rows are updated by default, e.g. after change of restaurant address
+    """
+    restaurant_pks = list(restaurant_pks)
+    orders = get_open_orders()
+    if product_pks is None:
+        orders = orders.filter(candidate_restaurants__restaurant__in=restaurant_pks).distinct()
+    else:
+        orders = orders.filter(products__product__in=list(product_pks)).distinct()
+
+    update_candidates(orders.only('lat', 'lng'), restaurant_pks=restaurant_pks)
+
+
+_changed_menu_items = local()
+
+
+def update_changed_menu_items_candidates():
+    """
+    Update rows of all menu items changed in this thread by one call.
+    """
+    changed_products = getattr(_changed_menu_items, 'products', None)
+    _changed_menu_items.products = None
+    if changed_products:
+        restaurant_pks = {restaurant_pk for restaurant_pk, _ in changed_products}
+        update_restaurants_candidates(restaurant_pks, {product_pk for _, product_pk in changed_products})
+
+
+def schedule_menu_items_candidates_update(menu_items):
+    """
+    Update rows of changed menu items after commit. Menu items changed in one transaction are updated at once:
+    the first callback updates all of them, the next ones find nothing to do.
+    :param menu_items: iterable of tuples (restaurant pk, product pk)
+    """
+    if getattr(_changed_menu_items, 'products', None) is None:
+        _changed_menu_items.products = set()
+    _changed_menu_items.products.update(menu_items)
+
+    transaction.on_commit(update_changed_menu_items_candidates)
+
+
+def get_orders_candidates(orders, k: int = None, radius_km: float = None) -> dict:
+    """
+    Read stored candidates of orders by one query.
+    :param orders: iterable of orders
+    :param k: keep only k nearest restaurants for every geocoded order
+    :param radius_km: keep only restaurants within the radius for every geocoded order
+    :return: dict {order pk: list of tuples (restaurant, distance in kilometers or None)} sorted by distance,
+        unknown distances are last, and overloaded restaurants are after all the others
+    """
+    orders = list(orders)
+    candidates = OrderCandidateRestaurant.objects.filter(
+        order__in=[order.pk for order in orders],
+    ).select_related('restaurant').annotate(
+        is_overloaded=ExpressionWrapper(
+            Q(restaurant__active_orders_count__gte=F('restaurant__max_active_orders')),
+            output_field=BooleanField(),
+        ),
+    ).order_by('order', 'is_overloaded', F('distance_km').asc(nulls_last=True), 'restaurant__name')
+
+    orders_candidates = {order.pk: [] for order in orders}
+    for candidate in candidates:
+        orders_candidates[candidate.order_id].append((candidate.restaurant, candidate.distance_km))
+
+    if k is None and radius_km is None:
+        return orders_candidates
+
+    for order in orders:
+        if not order.coordinates:
+            continue
+        orders_candidates[order.pk] = [
+            (restaurant, distance_km) for restaurant, distance_km in orders_candidates[order.pk]
+            if distance_km is not None and (radius_km is None or distance_km <= radius_km)
+        ][:k]
+
+    return orders_candidates
@@ -0,0 +1,145 @@
+"""
+Cache of filtered pages of the product catalog API, the whole catalog is served by foodcartapp/snapshot.py.
+
+Rendered pages are stored in Django cache under the current catalog version. The version is changed
+after commit of every change of products, categories and menu items, bulk changes of menu items included,
+so stale responses are never read again. Responses are also dropped after settings.CATALOG_CACHE_TIMEOUT seconds
+for changes which are not signalled, e.g. made by Product.objects.update.
+"""
+import hashlib
+import json
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import quote_etag
+
+from foodcartapp.models import Product
+from foodcartapp.renderers import Renderer
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+PRODUCT_FIELDS = ('id', 'name', 'price', 'special_status', 'description', 'category', 'image', 'restaurant')
+
+
+def get_catalog_version() -> int:
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    # versions are timestamps, so the version lost by cache is never reused for other content
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def dump_products(products) -> list:
+    dumped_products = []
+    for product in products:
+        dumped_product = {
+            'id': product.id,
+            'name': product.name,
+            'price': product.price,
+            'special_status': product.special_status,
+            'description': product.description,
+            'category': {
+                'id': product.category.id,
+                'name': product.category.name,
+            } if product.category else None,
+            'image': product.image.url,
+            'restaurant': {
+                'id': product.id,
+                'name': product.name,
+            }
+        }
+        dumped_products.append(dumped_product)
+    return dumped_products
+
+
+def encode_cursor(product) -> str:
+    return urlsafe_b64encode(str(product.pk).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    :return: primary key of the last product of previous page
+    :raise ValueError: when cursor is invalid
+    """
+    return int(urlsafe_b64decode(cursor.encode()).decode())
+
+
+def filter_products(products, filters: dict):
+    """
+    :param products: QuerySet of products
+    :param filters: cleaned data of ProductsFilter
+    """
+    if filters.get('category') is not None:
+        products = products.filter(category=filters['category'])
+    if filters.get('special_status') is not None:
+        products = products.filter(special_status=filters['special_status'])
+    if filters.get('restaurant') is not None:
+        products = products.filter(menu_items__restaurant=filters['restaurant'], menu_items__availability=True)
+    if filters.get('q'):
+        products = products.filter(name__icontains=filters['q'])
+    return products
+
+
+def get_products_page(filters: dict) -> dict:
+    """
+    Filtered page of catalog. Pages are selected by keyset of primary key.
+    :param filters: cleaned data of ProductsFilter
+    :return: dict with products of the page and cursor of next page or None, when the page is the last one
+    """
+    limit = filters.get('limit') or settings.PRODUCTS_API_PAGE_SIZE
+
+    products = filter_products(Product.objects.select_related('category').available(), filters).order_by('pk')
+    if filters.get('cursor') is not None:
+        products = products.filter(pk__gt=filters['cursor'])
+
+    products = list(products[:limit + 1])
+    next_cursor = encode_cursor(products[limit - 1]) if len(products) > limit else None
+
+    dumped_products = dump_products(products[:limit])
+    if filters.get('fields'):
+        dumped_products = [
+            {field: product[field] for field in filters['fields']}
+            for product in dumped_products
+        ]
+
+    return {
+        'results': dumped_products,
+        'next_cursor': next_cursor,
+    }
+
+
+def get_cached_response(cache_key: str, renderer: Renderer, get_data) -> dict:
+    """
+    :param cache_key: key of response in current catalog version
+    :param renderer: renderer of response, every format is cached separately
+    :param get_data: function which returns data of response
+    :return: dict with rendered content, its strong etag and last_modified timestamp
+    """
+    cache_key = f'catalog:{get_catalog_version()}:{renderer.format}:{cache_key}'
+
+    cached_response = cache.get(cache_key)
+    if cached_response is None:
+        content = renderer.render(get_data())
+        cached_response = {
+            'content': content,
+            'etag': quote_etag(hashlib.blake2b(content, digest_size=16).hexdigest()),
+            'last_modified': int(time.time()),
+        }
+        cache.set(cache_key, cached_response, timeout=settings.CATALOG_CACHE_TIMEOUT)
+
+    return cached_response
+
+
+def get_products_page_response(renderer: Renderer, filters: dict) -> dict:
+    """
+    Filtered page of catalog, every combination of filters is cached separately.
+    """
+    filters_key = hashlib.blake2b(json.dumps(filters, sort_keys=True).encode(), digest_size=16).hexdigest()
+    return get_cached_response(f'products:{filters_key}', renderer, lambda: get_products_page(filters))
@@ -0,0 +1,80 @@
+"""
+Automatic assignment of new orders to restaurants.
+
+New orders without selected restaurant are assigned to restaurants which can prepare them,
+nearest pairs first, while restaurants have free capacity (greedy solution of assignment problem).
+Orders without known distances to restaurants are left to managers.
+"""
+from collections import Counter
+
+from django.db import transaction
+
+from foodcartapp.models import Order, OrderCandidateRestaurant, Restaurant
+from foodcartapp.restaurant_load import change_restaurants_load
+
+
+def get_pending_orders():
+    return Order.objects.filter(status=Order.Status.NEW, selected_restaurant__isnull=True)
+
+
+def get_restaurants_capacity() -> dict:
+    """
+    Restaurants are locked until commit, so concurrent dispatchers do not exceed their limits.
+    :return: dict {restaurant pk: count of orders which the restaurant can take more}
+    """
+    restaurants = Restaurant.objects.select_for_update().values_list('pk', 'max_active_orders', 'active_orders_count')
+    return {pk: max(limit - load, 0) for pk, limit, load in restaurants}
+
+
+def assign_greedy(candidates, capacity: dict) -> dict:
+    """
+    Assign every order to the nearest restaurant which has free capacity, nearest pairs are assigned first.
+    :param candidates: iterable of tuples (order pk, restaurant pk, distance)
+    :param capacity: dict {restaurant pk: count of orders which the restaurant can take}, it is not changed
+    :return: dict {order pk: restaurant pk}
+    """
+    capacity = dict(capacity)
+    assignments = {}
+
+    for order_pk, restaurant_pk, _ in sorted(candidates, key=lambda candidate: candidate[2]):
+        if order_pk in assignments or capacity.get(restaurant_pk, 0) <= 0:
+            continue
+        assignments[order_pk] = restaurant_pk
+        capacity[restaurant_pk] -= 1
+
+    return assignments
+
+
+def dispatch_orders(order_pks) -> int:
+    """
+    Assign pending orders to restaurants and save assignments by one query.
+    Orders are locked until commit, so they are not assigned twice by concurrent dispatchers.
+    :param order_pks: primary keys of orders to assign, orders which are not pending anymore are skipped
+    :return: count of assigned orders
+    """
+    with transaction.atomic():
+        orders = {
+            order.pk: order
+            for order in get_pending_orders().filter(pk__in=list(order_pks)).select_for_update(skip_locked=True)
+        }
+        if not orders:
+            return 0
+
+        candidates = OrderCandidateRestaurant.objects.filter(
+            order__in=list(orders),
+            distance_km__isnull=False,
+        ).values_list('order', 'restaurant', 'distance_km')
+
+        assignments = assign_greedy(candidates, get_restaurants_capacity())
+
+        assigned_orders = []
+        for order_pk, restaurant_pk in assignments.items():
+            order = orders[order_pk]
+            order.selected_restaurant_id = restaurant_pk
+            order.status = Order.Status.ASSEMBLY
+            assigned_orders.append(order)
+
+        Order.objects.bulk_update(assigned_orders, ['selected_restaurant', 'status'])
+        change_restaurants_load(Counter(assignments.values()))
+
+    return len(assigned_orders)
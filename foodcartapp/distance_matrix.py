@@ -0,0 +1,103 @@
+"""
+Distances between many points at once.
+
+Points are tuples (lat, lng) in degrees or None for unknown places, distances are in kilometers.
+Unknown distances are NaN.
+
+Methods:
+    haversine - great-circle distance on a sphere of mean Earth radius. Relative error against
+        geodesic on WGS-84 ellipsoid is not greater than 0.5%, i.e. up to 50 m on 10 km.
+    equirectangular - flat projection, the fastest one. Additionally to haversine error it has
+        error growing with distance: below 0.1% for distances shorter than 100 km, which is enough for a city.
+    geodesic - exact distance on WGS-84 ellipsoid by geopy (Karney), computed pair by pair, slow.
+"""
+import numpy as np
+from geopy import distance
+
+EARTH_RADIUS_KM = 6371.0088
+
+HAVERSINE = 'haversine'
+EQUIRECTANGULAR = 'equirectangular'
+GEODESIC = 'geodesic'
+
+
+def to_radians(points) -> np.ndarray:
+    """
+    :param points: sequence of (lat, lng) or None
+    :return: array of shape (len(points), 2) in radians, NaN for unknown points
+    """
+    coordinates = np.array(
+        [(float(point[0]), float(point[1])) if point else (np.nan, np.nan) for point in points],
+        dtype=float,
+    ).reshape(-1, 2)
+    return np.radians(coordinates)
+
+
+def haversine(lat1, lng1, lat2, lng2) -> np.ndarray:
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def equirectangular(lat1, lng1, lat2, lng2) -> np.ndarray:
+    x = (lng2 - lng1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_KM * np.hypot(x, y)
+
+
+def geodesic(lat1, lng1, lat2, lng2) -> np.ndarray:
+    lat1, lng1, lat2, lng2 = np.broadcast_arrays(*map(np.degrees, (lat1, lng1, lat2, lng2)))
+    distances = np.full(lat1.shape, np.nan)
+
+    for index in np.ndindex(distances.shape):
+        source_point = lat1[index], lng1[index]
+        destination_point = lat2[index], lng2[index]
+        if not np.isnan((*source_point, *destination_point)).any():
+            distances[index] = distance.distance(source_point, destination_point).km
+
+    return distances
+
+
+FORMULAS = {
+    HAVERSINE: haversine,
+    EQUIRECTANGULAR: equirectangular,
+    GEODESIC: geodesic,
+}
+
+
+def get_formula(method: str):
+    if method not in FORMULAS:
+        raise ValueError(f'Unknown distance method: {method!r}')
+    return FORMULAS[method]
+
+
+def distance_matrix(source_points, destination_points, method: str = HAVERSINE) -> np.ndarray:
+    """
+    Evaluate distances from every source point to every destination point.
+    :param source_points: sequence of (lat, lng) or None
+    :param destination_points: sequence of (lat, lng) or None
+    :param method: haversine, equirectangular or geodesic
+    :return: array of shape (len(source_points), len(destination_points)) in kilometers, NaN for unknown distances
+    """
+    formula = get_formula(method)
+    sources = to_radians(source_points)
+    destinations = to_radians(destination_points)
+
+    return formula(
+        sources[:, 0, np.newaxis], sources[:, 1, np.newaxis],
+        destinations[np.newaxis, :, 0], destinations[np.newaxis, :, 1],
+    )
+
+
+def paired_distances(source_points, destination_points, method: str = HAVERSINE) -> np.ndarray:
+    """
+    Evaluate distances from every source point to destination point with the same index.
+    :param source_points: sequence of (lat, lng) or None
+    :param destination_points: sequence of (lat, lng) or None with the same length
+    :param method: haversine, equirectangular or geodesic
+    :return: array of shape (len(source_points),) in kilometers, NaN for unknown distances
+    """
+    formula = get_formula(method)
+    sources = to_radians(source_points)
+    destinations = to_radians(destination_points)
+
+    return formula(sources[:, 0], sources[:, 1], destinations[:, 0], destinations[:, 1])
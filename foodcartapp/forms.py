@@ -1,6 +1,8 @@
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
 
+from foodcartapp.catalog import PRODUCT_FIELDS, decode_cursor
 from foodcartapp.models import Order
 
 
@@ -35,3 +37,35 @@ class OrderAdminForm(forms.ModelForm):
             raise ValidationError('Доставка не может быть совершена до звонка оператора')
 
         return cleaned_delivered_at
+
+
+class ProductsFilter(forms.Form):
+    category = forms.IntegerField(required=False, min_value=1)
+    special_status = forms.NullBooleanField(required=False)
+    restaurant = forms.IntegerField(required=False, min_value=1)
+    q = forms.CharField(required=False, max_length=100)
+    cursor = forms.CharField(required=False)
+    limit = forms.IntegerField(required=False, min_value=1, max_value=settings.PRODUCTS_API_MAX_PAGE_SIZE)
+    fields = forms.CharField(required=False)
+
+    def clean_cursor(self):
+        cursor = self.cleaned_data.get('cursor')
+        if not cursor:
+            return None
+
+        try:
+            return decode_cursor(cursor)
+        except ValueError:
+            raise ValidationError('Неверный курсор')
+
+    def clean_fields(self):
+        fields = self.cleaned_data.get('fields')
+        if not fields:
+            return None
+
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown_fields = set(fields) - set(PRODUCT_FIELDS)
+        if unknown_fields:
+            raise ValidationError(f'Неизвестные поля: {", ".join(sorted(unknown_fields))}')
+
+        return fields
@@ -1,58 +1,316 @@
+import asyncio
+import logging
+from threading import Lock
+
 from django.conf import settings
-import requests
-from geopy import distance
+import numpy as np
 
+from cache_address_app.concurrency import submit_background
 from cache_address_app.decorators import use_db_cache
+from cache_address_app.distances import get_cached_distances
+from foodcartapp.distance_matrix import distance_matrix, paired_distances
+from foodcartapp.geocoders import geocode
 from foodcartapp.models import Order
+from foodcartapp.spatial_index import get_restaurants_index
+
+logger = logging.getLogger(__name__)
 
 
 @use_db_cache
 def fetch_coordinates(apikey, address):
-    base_url = 'https://geocode-maps.yandex.ru/1.x'
-    response = requests.get(base_url, params={
-        'geocode': address,
-        'apikey': apikey,
-        'format': 'json',
-    })
-    response.raise_for_status()
-    found_places = response.json()['response']['GeoObjectCollection']['featureMember']
+    return geocode(apikey, address)
+
+
+def fetch_many_coordinates(addresses, timeout: float = None, catch_exceptions: bool = False) -> dict:
+    """
+    Fetch coordinates for many addresses at once.
+    :param addresses: iterable of addresses
+    :param timeout: max time of geocoding in seconds, addresses which are not geocoded in time
+        are absent in result and will be cached in background
+    :param catch_exceptions: return exceptions of failed addresses instead of coordinates
+    :return: dict {address: coordinates or None}
+    """
+    return fetch_coordinates.fetch_many(
+        settings.YANDEX_GEOCODER_API_KEY, addresses, timeout=timeout, catch_exceptions=catch_exceptions,
+    )
+
+
+def get_point(coordinates):
+    """
+    Convert geocoder coordinates (lng, lat) to point (lat, lng) which is expected by geopy.
+    """
+    if coordinates:
+        lng, lat = coordinates
+        return lat, lng
 
-    if not found_places:
-        return None
 
-    most_relevant = found_places[0]
-    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(' ')
-    return lon, lat
+def get_distances(order: Order, restaurants, sort=False, method: str = None, k: int = None, radius_km: float = None):
+    """
+    Evaluate distances from restaurants to order address.
+    Nothing is geocoded here, stored coordinates of order and restaurants are used.
+    :param order: Order for delivery
+    :param restaurants: iterable of restaurants
+    :param sort: sort by distance, unknown distances will be last
+    :param method: method of distance_matrix, settings.DISTANCE_METHOD by default
+    :param k: return only k nearest restaurants
+    :param radius_km: return only restaurants within the radius
+    :return: list of tuples (restaurant, distance in kilometers or None)
+    """
+    return get_many_distances(
+        [order], {order.pk: restaurants},
+        sort=sort, method=method, k=k, radius_km=radius_km,
+    )[order.pk]
 
 
-def evaluate_distance(source_address: str, destination_address: str) -> float | None:
+def get_many_distances(orders, mapped_restaurants: dict, sort=False, method: str = None,
+                       k: int = None, radius_km: float = None) -> dict:
     """
-    Evaluate distance between two addresses. Return distance in kilometers or None, when one of address not be found.
-    :param source_address: Address of source place
-    :param destination_address: Address of destination place
-    :return: distance in kilometers or None, when one of address not be found
+    Evaluate distances from restaurants to addresses of many orders by one distance matrix.
+    When k or radius_km is passed, restaurants are pruned by spatial index before evaluation,
+    restaurants without coordinates are skipped then.
+    :param orders: iterable of orders
+    :param mapped_restaurants: dict {order pk: iterable of restaurants}
+    :param sort: sort by distance, unknown distances will be last
+    :param method: method of distance_matrix, settings.DISTANCE_METHOD by default
+    :param k: keep only k nearest restaurants for every order
+    :param radius_km: keep only restaurants within the radius
+    :return: dict {order pk: list of tuples (restaurant, distance in kilometers or None)}
     """
-    api_key = settings.YANDEX_GEOCODER_API_KEY
+    orders = list(orders)
+    mapped_restaurants = {
+        order.pk: list(mapped_restaurants.get(order.pk, []))
+        for order in orders
+    }
 
-    source_coordinate = fetch_coordinates(api_key, source_address)
-    destination_coordinate = fetch_coordinates(api_key, destination_address)
+    if k is not None or radius_km is not None:
+        index = get_restaurants_index()
+        for order in orders:
+            if not order.coordinates:
+                continue
+            order_restaurants = {restaurant.pk: restaurant for restaurant in mapped_restaurants[order.pk]}
+            nearest = index.nearest(order.coordinates, k=k, radius_km=radius_km, keys=order_restaurants)
+            mapped_restaurants[order.pk] = [order_restaurants[pk] for pk, _ in nearest]
 
-    if all((source_coordinate, destination_coordinate)):
-        distance_between = distance.distance(source_coordinate, destination_coordinate).km
+    method = method or settings.DISTANCE_METHOD
+    if settings.DISTANCE_CACHE_ENABLED:
+        evaluated_distances = evaluate_distances_with_cache(orders, mapped_restaurants, method)
     else:
-        distance_between = None
+        evaluated_distances = evaluate_distances_by_matrix(orders, mapped_restaurants, method)
+
+    orders_distances = {}
+    for order in orders:
+        order_restaurants = mapped_restaurants[order.pk]
+        distances = evaluated_distances[order.pk]
+
+        # NaN distances are sorted to the end
+        indexes = np.argsort(distances, kind='stable') if sort else range(len(order_restaurants))
 
-    return distance_between
+        orders_distances[order.pk] = [
+            (order_restaurants[index], None if np.isnan(distances[index]) else float(distances[index]))
+            for index in indexes
+        ]
 
+    return orders_distances
+
+
+def evaluate_distances_by_matrix(orders, mapped_restaurants: dict, method: str) -> dict:
+    """
+    :return: dict {order pk: array of distances to restaurants of the order, NaN for unknown}
+    """
+    restaurants = list({
+        restaurant.pk: restaurant
+        for order_restaurants in mapped_restaurants.values()
+        for restaurant in order_restaurants
+    }.values())
+    columns = {restaurant.pk: column for column, restaurant in enumerate(restaurants)}
+
+    matrix = distance_matrix(
+        [order.coordinates for order in orders],
+        [restaurant.coordinates for restaurant in restaurants],
+        method=method,
+    )
+
+    return {
+        order.pk: matrix[row, [columns[restaurant.pk] for restaurant in mapped_restaurants[order.pk]]]
+        for row, order in enumerate(orders)
+    }
+
+
+def evaluate_distances_with_cache(orders, mapped_restaurants: dict, method: str) -> dict:
+    """
+    The same as evaluate_distances_by_matrix, but distances of all pairs are loaded from CachedDistance by one query.
+    """
+    pairs = {
+        (order.coordinates, restaurant.coordinates)
+        for order in orders
+        for restaurant in mapped_restaurants[order.pk]
+        if order.coordinates and restaurant.coordinates
+    }
+
+    cached_distances = get_cached_distances(
+        pairs,
+        method,
+        evaluate=lambda missed_pairs: paired_distances(*zip(*missed_pairs), method=method).tolist(),
+    )
+
+    return {
+        order.pk: np.array([
+            cached_distances.get((order.coordinates, restaurant.coordinates), np.nan)
+            for restaurant in mapped_restaurants[order.pk]
+        ], dtype=float)
+        for order in orders
+    }
+
+
+def update_restaurants_coordinates(restaurants):
+    """
+    Geocode addresses of restaurants and set lat and lng of them. Restaurants are not saved.
+    :param restaurants: iterable of restaurants
+    """
+    restaurants = list(restaurants)
+    coordinates = fetch_many_coordinates(
+        {restaurant.address for restaurant in restaurants if restaurant.address}
+    )
+
+    for restaurant in restaurants:
+        restaurant.lat, restaurant.lng = get_point(coordinates.get(restaurant.address)) or (None, None)
+
+
+def set_orders_coordinates(orders, coordinates: dict):
+    """
+    Set lat, lng and geocode_status of orders. Orders are not saved.
+    :param orders: iterable of orders
+    :param coordinates: dict {address: coordinates or None}, orders with absent addresses are not changed
+    :return: list of changed orders
+    """
+    changed_orders = []
+    for order in orders:
+        if order.address not in coordinates:
+            continue
 
-def get_distances(order: Order, restaurants, sort=False):
-    restaurants_with_distance = [
-        (restaurant, evaluate_distance(restaurant.address, order.address))
-        for restaurant in restaurants
-    ]
+        point = get_point(coordinates[order.address])
+        order.lat, order.lng = point or (None, None)
+        order.geocode_status = Order.GeocodeStatus.FOUND if point else Order.GeocodeStatus.NOT_FOUND
+        changed_orders.append(order)
 
-    if sort:
-        # https://stackoverflow.com/a/18411610/5252227
-        restaurants_with_distance.sort(key=lambda x: (x[1] is None, x[1]))
+    return changed_orders
+
+
+def save_orders_coordinates(orders):
+    """
+    Save lat, lng and geocode_status of geocoded orders by one query.
+    Orders already geocoded by another request or background job meanwhile are not overwritten.
+    :param orders: list of orders
+    """
+    Order.objects.filter(
+        geocode_status__in=[Order.GeocodeStatus.PENDING, Order.GeocodeStatus.FAILED],
+    ).bulk_update(orders, ['lat', 'lng', 'geocode_status'])
+
+
+def geocode_orders(orders, timeout: float = None):
+    """
+    Geocode addresses of orders and set lat, lng and geocode_status of them. Orders are not saved.
+    :param orders: iterable of orders
+    :param timeout: max time of geocoding in seconds, orders which are not geocoded in time are not changed
+    :return: list of changed orders, which geocoding is finished or failed
+    """
+    orders = list(orders)
+
+    coordinates = fetch_many_coordinates({order.address for order in orders}, timeout=timeout, catch_exceptions=True)
+
+    # any error of geocoder fails only orders with this address
+    failed_addresses = set()
+    for address, result in coordinates.items():
+        if isinstance(result, Exception):
+            logger.error('Geocoding of order address %r failed', address, exc_info=result)
+            failed_addresses.add(address)
+
+    return mark_orders_failed(
+        orders,
+        set_orders_coordinates(orders, {
+            address: result for address, result in coordinates.items() if address not in failed_addresses
+        }),
+        failed_addresses,
+    )
+
+
+def mark_orders_failed(orders, changed_orders: list, failed_addresses: set) -> list:
+    """
+    Set FAILED geocode_status of orders with failed addresses.
+    :return: changed orders with failed ones
+    """
+    for order in orders:
+        if order.address in failed_addresses:
+            order.geocode_status = Order.GeocodeStatus.FAILED
+            changed_orders.append(order)
+
+    return changed_orders
+
+
+async def geocode_orders_async(orders, timeout: float = None):
+    """
+    Async version of geocode_orders. Addresses are geocoded concurrently without blocking of event loop.
+    :param orders: list of orders
+    :param timeout: max time of geocoding in seconds, orders which are not geocoded in time are not changed
+    :return: list of changed orders, which geocoding is finished or failed
+    """
+    # geocoder is called on the bounded background pool, so waiting can be interrupted without waiting for threads
+    tasks = {
+        asyncio.wrap_future(submit_background(fetch_coordinates, settings.YANDEX_GEOCODER_API_KEY, address)): address
+        for address in {order.address for order in orders}
+    }
+    if not tasks:
+        return []
+
+    # pending tasks are not cancelled: cancel of wrapped future drops the job queued on the pool,
+    # so they are left to finish in background and results will be cached
+    done, _ = await asyncio.wait(tasks, timeout=timeout)
+
+    coordinates = {}
+    failed_addresses = set()
+    for task in done:
+        error = task.exception()
+        if error:
+            logger.error('Geocoding of order address %r failed', tasks[task], exc_info=error)
+            failed_addresses.add(tasks[task])
+        else:
+            coordinates[tasks[task]] = task.result()
+
+    return mark_orders_failed(orders, set_orders_coordinates(orders, coordinates), failed_addresses)
+
+
+# orders which geocoding is scheduled or running in this process
+_geocoding_order_pks = set()
+_geocoding_order_pks_lock = Lock()
+
+
+def geocode_stored_orders(order_pks):
+    """
+    Geocode orders which are still not geocoded, orders geocoded meanwhile by another process are skipped.
+    """
+    from foodcartapp.candidates import update_orders_candidates
+
+    try:
+        orders = list(Order.objects.filter(
+            pk__in=order_pks,
+            geocode_status__in=[Order.GeocodeStatus.PENDING, Order.GeocodeStatus.FAILED],
+        ).only('address'))
+        save_orders_coordinates(geocode_orders(orders))
+        update_orders_candidates(order.pk for order in orders)
+    finally:
+        with _geocoding_order_pks_lock:
+            _geocoding_order_pks.difference_update(order_pks)
+
+
+def schedule_orders_geocoding(order_pks):
+    """
+    Geocode orders in background. Call it after commit of transaction which saved the orders.
+    Orders which geocoding is already scheduled or running are skipped.
+    :param order_pks: iterable of primary keys of orders
+    """
+    with _geocoding_order_pks_lock:
+        order_pks = set(order_pks) - _geocoding_order_pks
+        _geocoding_order_pks.update(order_pks)
 
-    return restaurants_with_distance
+    if order_pks:
+        submit_background(geocode_stored_orders, list(order_pks))
@@ -0,0 +1,158 @@
+import hashlib
+import time
+from functools import lru_cache
+from threading import Lock
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class Geocoder:
+    """
+    Base class of geocoder backends. Backend is selected by settings.GEOCODER_BACKEND.
+    """
+
+    def geocode(self, api_key: str, address: str):
+        """
+        :param api_key: API key of geocoder service
+        :param address: address to find
+        :return: tuple (lng, lat) or None, when address is not found
+        """
+        raise NotImplementedError('`geocode()` must be implemented.')
+
+
+class YandexGeocoder(Geocoder):
+    """
+    Client of Yandex geocoder. Keep-alive connections are pooled by one session,
+    every request is bounded by timeouts and failed requests are retried with backoff.
+    """
+    base_url = 'https://geocode-maps.yandex.ru/1.x'
+
+    def __init__(self):
+        self.timeout = (settings.GEOCODER_CONNECT_TIMEOUT, settings.GEOCODER_READ_TIMEOUT)
+
+        retry = Retry(
+            total=settings.GEOCODER_RETRIES,
+            backoff_factor=settings.GEOCODER_BACKOFF_FACTOR,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET',),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_maxsize=settings.GEOCODER_MAX_WORKERS,
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+
+    def geocode(self, api_key: str, address: str):
+        response = self.session.get(self.base_url, params={
+            'geocode': address,
+            'apikey': api_key,
+            'format': 'json',
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        found_places = response.json()['response']['GeoObjectCollection']['featureMember']
+
+        if not found_places:
+            return None
+
+        most_relevant = found_places[0]
+        lon, lat = most_relevant['GeoObject']['Point']['pos'].split(' ')
+        return lon, lat
+
+
+class StubGeocoder(Geocoder):
+    """
+    Offline geocoder for development and load testing. Address is converted to the same point in Moscow every time.
+    Latency of real service can be emulated by settings.GEOCODER_STUB_LATENCY in seconds.
+    """
+    min_lng, max_lng = 37.35, 37.85
+    min_lat, max_lat = 55.57, 55.91
+
+    def geocode(self, api_key: str, address: str):
+        if settings.GEOCODER_STUB_LATENCY:
+            time.sleep(settings.GEOCODER_STUB_LATENCY)
+
+        if not address.strip():
+            return None
+
+        digest = hashlib.sha256(address.encode()).digest()
+        lng_ratio = int.from_bytes(digest[:4], 'big') / 2 ** 32
+        lat_ratio = int.from_bytes(digest[4:8], 'big') / 2 ** 32
+
+        lng = self.min_lng + (self.max_lng - self.min_lng) * lng_ratio
+        lat = self.min_lat + (self.max_lat - self.min_lat) * lat_ratio
+        return f'{lng:.6f}', f'{lat:.6f}'
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Geocoder is not called, because it has failed too many times recently.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stop calling a failing service for cool-down period after some consecutive failures.
+    After cool-down one trial call is allowed: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, max_failures: int, cooldown: float):
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and time.monotonic() < self.opened_at + self.cooldown
+
+    def call(self, func, *args, **kwargs):
+        with self._lock:
+            if self.is_open:
+                raise CircuitOpenError(f'Circuit is open after {self.failures} failures')
+            if self.opened_at is not None:
+                # cool-down is over, the next failure opens the circuit again
+                self.opened_at = time.monotonic()
+
+        try:
+            result = func(*args, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.failures += 1
+                if self.failures >= self.max_failures:
+                    self.opened_at = time.monotonic()
+            raise
+
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+        return result
+
+
+@lru_cache(maxsize=None)
+def get_geocoder() -> Geocoder:
+    return import_string(settings.GEOCODER_BACKEND)()
+
+
+@lru_cache(maxsize=None)
+def get_circuit_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        max_failures=settings.GEOCODER_CIRCUIT_MAX_FAILURES,
+        cooldown=settings.GEOCODER_CIRCUIT_COOLDOWN,
+    )
+
+
+def geocode(api_key: str, address: str):
+    """
+    Geocode address by backend from settings.GEOCODER_BACKEND guarded by circuit breaker.
+    :raise CircuitOpenError: when geocoder has failed too many times recently
+    """
+    return get_circuit_breaker().call(get_geocoder().geocode, api_key, address)
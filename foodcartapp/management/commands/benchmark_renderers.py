@@ -0,0 +1,80 @@
+import gzip
+import json
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from foodcartapp.renderers import Renderer, JSONRenderer, FastJSONRenderer, MessagePackRenderer
+
+
+class PrettyJSONRenderer(JSONRenderer):
+    """
+    Former output of API views by JsonResponse, for comparison only.
+    """
+
+    def render(self, data) -> bytes:
+        return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, indent=4).encode()
+
+
+def get_fake_catalog(products_count: int) -> list:
+    return [
+        {
+            'id': pk,
+            'name': f'Чизбургер №{pk}',
+            'price': Decimal('249.00') + pk,
+            'special_status': pk % 10 == 0,
+            'description': 'Булочка, котлета из говядины, сыр чеддер, маринованные огурцы, лук, кетчуп и горчица',
+            'category': {
+                'id': pk % 5,
+                'name': 'Бургеры',
+            },
+            'image': f'/media/burger_{pk}.jpg',
+            'restaurant': {
+                'id': pk,
+                'name': f'Чизбургер №{pk}',
+            },
+        }
+        for pk in range(1, products_count + 1)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compare encode time and payload size of API renderers on fake catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=1000,
+            help='Count of products in the catalog',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Count of encodings measured for every renderer',
+        )
+
+    def handle(self, *args, **options):
+        catalog = get_fake_catalog(options['products'])
+        renderers = [PrettyJSONRenderer(), JSONRenderer(), FastJSONRenderer(), MessagePackRenderer()]
+
+        self.stdout.write(f'{"renderer":<20} {"encode, ms":>10} {"size, KB":>10} {"gzip, KB":>10}')
+        for renderer in renderers:
+            self.benchmark(renderer, catalog, options['repeat'])
+
+    def benchmark(self, renderer: Renderer, catalog: list, repeat: int):
+        name = type(renderer).__name__
+        if not renderer.is_available():
+            self.stdout.write(f'{name:<20} is not available, install its dependency')
+            return
+
+        content = renderer.render(catalog)
+        seconds = min(timeit.repeat(lambda: renderer.render(catalog), number=1, repeat=repeat))
+
+        self.stdout.write(
+            f'{name:<20} {seconds * 1000:>10.2f} {len(content) / 1024:>10.1f} '
+            f'{len(gzip.compress(content)) / 1024:>10.1f}'
+        )
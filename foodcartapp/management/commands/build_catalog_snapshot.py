@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.snapshot import build_snapshot, get_snapshot_dir
+
+
+class Command(BaseCommand):
+    help = 'Build snapshot of the product catalog, e.g. after deploy or bulk changes of products'
+
+    def handle(self, *args, **options):
+        version = build_snapshot()
+        self.stdout.write(f'Built snapshot {version} in {get_snapshot_dir()}')
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.dispatcher import dispatch_orders, get_pending_orders
+
+
+class Command(BaseCommand):
+    help = 'Assign new orders to the nearest restaurants which can prepare them and have free capacity'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Count of orders assigned at once',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=None,
+            help='Repeat every INTERVAL seconds, run once by default',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.dispatch(options['batch_size'])
+
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
+
+    def dispatch(self, batch_size: int):
+        # the oldest orders are assigned first
+        order_pks = list(get_pending_orders().order_by('created_at', 'pk').values_list('pk', flat=True))
+
+        assigned = 0
+        for start in range(0, len(order_pks), batch_size):
+            assigned += dispatch_orders(order_pks[start:start + batch_size])
+
+        self.stdout.write(f'Assigned {assigned} of {len(order_pks)} new orders')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.geo_tools import update_restaurants_coordinates
+from foodcartapp.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = 'Geocode addresses of restaurants and store their coordinates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Geocode all restaurants, not only restaurants without coordinates',
+        )
+
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.all()
+        if not options['all']:
+            restaurants = restaurants.filter(lat__isnull=True)
+
+        restaurants = list(restaurants)
+        update_restaurants_coordinates(restaurants)
+        Restaurant.objects.bulk_update(restaurants, ['lat', 'lng'])
+
+        geocoded = sum(1 for restaurant in restaurants if restaurant.coordinates)
+        self.stdout.write(f'Geocoded {geocoded} of {len(restaurants)} restaurants')
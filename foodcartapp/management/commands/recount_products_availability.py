@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+
+from foodcartapp.models import Product, recount_changed_products
+
+
+class Command(BaseCommand):
+    help = 'Check counts of restaurants where products are available and fix wrong ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only show products with wrong counts',
+        )
+
+    def handle(self, *args, **options):
+        inconsistent_products = list(
+            Product.objects.annotate(
+                actual_count=Count('menu_items', filter=Q(menu_items__availability=True)),
+            ).exclude(
+                available_restaurants_count=F('actual_count'),
+            ).values_list('pk', 'name', 'available_restaurants_count', 'actual_count')
+        )
+
+        for pk, name, stored_count, actual_count in inconsistent_products:
+            self.stdout.write(f'Product {pk} {name!r}: stored {stored_count}, actual {actual_count}')
+
+        if inconsistent_products and not options['dry_run']:
+            # the catalog is built from the counts, so it is invalidated too
+            recount_changed_products({pk for pk, *_ in inconsistent_products})
+
+        self.stdout.write(f'Wrong counts: {len(inconsistent_products)}')
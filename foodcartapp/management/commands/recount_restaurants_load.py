@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.restaurant_load import recount_restaurants_load
+
+
+class Command(BaseCommand):
+    help = 'Recount orders which are assembled or delivered by restaurants, e.g. after bulk changes of orders'
+
+    def handle(self, *args, **options):
+        fixed = recount_restaurants_load()
+        self.stdout.write(f'Fixed counters of {fixed} restaurants')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.candidates import get_open_orders, update_candidates, remove_closed_orders_candidates
+
+
+class Command(BaseCommand):
+    help = 'Store restaurants which can prepare open orders and distances to them, remove rows of closed orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Count of orders updated at once',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        order_pks = list(get_open_orders().order_by('pk').values_list('pk', flat=True))
+
+        for start in range(0, len(order_pks), batch_size):
+            update_candidates(get_open_orders().filter(pk__in=order_pks[start:start + batch_size]).only('lat', 'lng'))
+
+        self.stdout.write(f'Updated candidates of {len(order_pks)} orders')
+
+        removed = remove_closed_orders_candidates()
+        self.stdout.write(f'Removed {removed} candidates of closed orders')
@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cache_address_app.concurrency import RateLimiter
+from cache_address_app.models import CachedAddress
+from cache_address_app.normalization import get_address_hash
+from foodcartapp.geocoders import geocode as geocode_address
+from foodcartapp.models import Restaurant, Order
+
+
+class Command(BaseCommand):
+    help = 'Geocode addresses of restaurants and active orders which are not cached yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rps',
+            type=float,
+            default=10,
+            help='Max requests per second to geocoder',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.GEOCODER_MAX_WORKERS,
+            help='Count of concurrent requests to geocoder',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Count of cached addresses saved by one query',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        addresses = {
+            *Restaurant.objects.exclude(address='').values_list('address', flat=True),
+            *Order.objects.exclude(
+                status__in=[Order.Status.FINISHED, Order.Status.CANCELED]
+            ).values_list('address', flat=True),
+        }
+        # geocoder gets original address, addresses with the same normalized form are geocoded once
+        addresses_by_hash = {get_address_hash(address): address for address in addresses}
+
+        hashes = list(addresses_by_hash)
+        cached_hashes = set()
+        for start in range(0, len(hashes), batch_size):
+            cached_hashes.update(
+                CachedAddress.objects.filter(
+                    address_hash__in=hashes[start:start + batch_size]
+                ).values_list('address_hash', flat=True)
+            )
+
+        missed = [address_hash for address_hash in hashes if address_hash not in cached_hashes]
+        self.stdout.write(f'Addresses: {len(hashes)}, cached: {len(cached_hashes)}, to geocode: {len(missed)}')
+
+        rate_limiter = RateLimiter(options['rps'])
+
+        def geocode(address_hash):
+            rate_limiter.wait()
+            return geocode_address(settings.YANDEX_GEOCODER_API_KEY, addresses_by_hash[address_hash])
+
+        stats = {'found': 0, 'not found': 0, 'failed': 0}
+        batch = []
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(geocode, address_hash): address_hash for address_hash in missed}
+
+            for done, future in enumerate(as_completed(futures), start=1):
+                address_hash = futures[future]
+
+                try:
+                    geodata = future.result()
+                except Exception as error:
+                    stats['failed'] += 1
+                    self.stderr.write(f'Geocoding of {addresses_by_hash[address_hash]!r} failed: {error}')
+                    continue
+
+                lng, lat = geodata or (None, None)
+                stats['found' if geodata else 'not found'] += 1
+                batch.append(CachedAddress(
+                    address=addresses_by_hash[address_hash],
+                    address_hash=address_hash,
+                    lng=lng,
+                    lat=lat,
+                    valid=bool(geodata),
+                ))
+
+                if len(batch) >= batch_size or done == len(missed):
+                    CachedAddress.objects.bulk_create(batch, ignore_conflicts=True)
+                    batch = []
+                    self.stdout.write(f'Geocoded {done} of {len(missed)}')
+
+        if batch:
+            CachedAddress.objects.bulk_create(batch, ignore_conflicts=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Hits: {len(cached_hashes)}, misses: {len(missed)}, '
+            f'found: {stats["found"]}, not found: {stats["not found"]}, failed: {stats["failed"]}'
+        ))
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:11
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0047_alter_order_payment_method'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='lat',
+            field=models.DecimalField(blank=True, decimal_places=14, max_digits=16, null=True, validators=[django.core.validators.MinValueValidator(-90.0), django.core.validators.MaxValueValidator(90.0)], verbose_name='широта'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='lng',
+            field=models.DecimalField(blank=True, decimal_places=14, max_digits=17, null=True, validators=[django.core.validators.MinValueValidator(-180.0), django.core.validators.MaxValueValidator(180.0)], verbose_name='долгота'),
+        ),
+    ]
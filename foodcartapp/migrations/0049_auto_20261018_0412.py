@@ -0,0 +1,29 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:12
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0048_auto_20261018_0411'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='geocode_status',
+            field=models.CharField(choices=[('P', 'Ожидает'), ('F', 'Найден'), ('N', 'Не найден'), ('E', 'Ошибка геокодера')], db_index=True, default='P', max_length=1, verbose_name='Статус геокодирования'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='lat',
+            field=models.DecimalField(blank=True, decimal_places=14, max_digits=16, null=True, validators=[django.core.validators.MinValueValidator(-90.0), django.core.validators.MaxValueValidator(90.0)], verbose_name='Широта'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='lng',
+            field=models.DecimalField(blank=True, decimal_places=14, max_digits=17, null=True, validators=[django.core.validators.MinValueValidator(-180.0), django.core.validators.MaxValueValidator(180.0)], verbose_name='Долгота'),
+        ),
+    ]
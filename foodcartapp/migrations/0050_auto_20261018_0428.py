@@ -0,0 +1,35 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0049_auto_20261018_0412'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderCandidateRestaurant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_km', models.FloatField(blank=True, null=True, verbose_name='расстояние, км')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidate_restaurants', to='foodcartapp.order', verbose_name='заказ')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidate_orders', to='foodcartapp.restaurant', verbose_name='ресторан')),
+            ],
+            options={
+                'verbose_name': 'ресторан, который может приготовить заказ',
+                'verbose_name_plural': 'рестораны, которые могут приготовить заказы',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ordercandidaterestaurant',
+            index=models.Index(fields=['order', 'distance_km'], name='foodcartapp_order_i_4a9cb3_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ordercandidaterestaurant',
+            unique_together={('order', 'restaurant')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0051_auto_20261018_0429'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='max_active_orders',
+            field=models.PositiveSmallIntegerField(default=10, help_text='Заказы назначаются ресторану автоматически, пока он собирает и доставляет меньше заказов', verbose_name='максимум заказов в работе'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:31
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_active_orders(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    Restaurant = apps.get_model('foodcartapp', 'Restaurant')
+
+    # orders passed to restaurant or to courier
+    load = Order.objects.filter(
+        status__in=['A', 'D'],
+        selected_restaurant__isnull=False,
+    ).values('selected_restaurant').annotate(orders_count=Count('pk')).values_list('selected_restaurant', 'orders_count')
+
+    for restaurant_pk, orders_count in load:
+        Restaurant.objects.filter(pk=restaurant_pk).update(active_orders_count=orders_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0052_restaurant_max_active_orders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='active_orders_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='заказов в работе'),
+        ),
+        migrations.RunPython(count_active_orders, migrations.RunPython.noop),
+    ]
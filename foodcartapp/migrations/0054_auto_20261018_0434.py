@@ -0,0 +1,25 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0053_restaurant_active_orders_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'id'], name='foodcartapp_categor_f6c6ed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['special_status', 'id'], name='foodcartapp_special_393196_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurantmenuitem',
+            index=models.Index(fields=['restaurant', 'availability', 'product'], name='foodcartapp_restaur_800177_idx'),
+        ),
+    ]
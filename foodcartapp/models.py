@@ -1,8 +1,12 @@
-from django.db import models
-from django.core.validators import MinValueValidator
-from django.db.models import UniqueConstraint, Q, F, CheckConstraint, Count, Value
+from functools import partial
+
+from django.db import models, transaction
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import UniqueConstraint, Q, F, CheckConstraint, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from phonenumber_field.modelfields import PhoneNumberField
 
+from foodcartapp.availability_index import get_availability_index, refresh_availability_index
 from foodcartapp.model_managers import OrderCostManager
 
 
@@ -21,6 +25,36 @@ class Restaurant(models.Model):
         max_length=50,
         blank=True,
     )
+    lng = models.DecimalField(
+        'долгота',
+        max_digits=17,
+        decimal_places=14,
+        validators=[
+            MinValueValidator(-180.0),
+            MaxValueValidator(180.0),
+        ],
+        null=True, blank=True,
+    )
+    lat = models.DecimalField(
+        'широта',
+        max_digits=16,
+        decimal_places=14,
+        validators=[
+            MinValueValidator(-90.0),
+            MaxValueValidator(90.0),
+        ],
+        null=True, blank=True,
+    )
+    max_active_orders = models.PositiveSmallIntegerField(
+        'максимум заказов в работе',
+        default=10,
+        help_text='Заказы назначаются ресторану автоматически, пока он собирает и доставляет меньше заказов',
+    )
+    active_orders_count = models.PositiveIntegerField(
+        'заказов в работе',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'ресторан'
@@ -29,15 +63,48 @@ class Restaurant(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        if update_fields is None and not self._state.adding:
+            # the counter is changed by atomic increments only, value loaded with the restaurant can be stale
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'active_orders_count'
+            ]
+        super().save(force_insert, force_update, using, update_fields)
+
+    @property
+    def is_overloaded(self) -> bool:
+        return self.active_orders_count >= self.max_active_orders
+
+    @property
+    def coordinates(self):
+        """
+        :return: tuple (lat, lng) or None, when address is not geocoded
+        """
+        if self.lat is None or self.lng is None:
+            return None
+        return self.lat, self.lng
+
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
-            RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
+        return self.filter(available_restaurants_count__gt=0)
+
+    def recount_available_restaurants(self) -> int:
+        """
+        Update available_restaurants_count of products by menu items, one query for all products.
+        :return: count of updated products
+        """
+        available_restaurants_count = RestaurantMenuItem.objects.filter(
+            product=OuterRef('pk'),
+            availability=True,
+        ).order_by().values('product').annotate(
+            restaurants_count=Count('pk'),
+        ).values('restaurants_count')
+
+        return self.update(
+            available_restaurants_count=Coalesce(Subquery(available_restaurants_count), 0),
         )
-        return self.filter(pk__in=products)
 
 
 class ProductCategory(models.Model):
@@ -86,6 +153,12 @@ class Product(models.Model):
         max_length=200,
         blank=True,
     )
+    available_restaurants_count = models.PositiveIntegerField(
+        'в продаже в ресторанах',
+        default=0,
+        editable=False,
+        db_index=True,
+    )
 
     objects = ProductQuerySet.as_manager()
 
@@ -93,10 +166,91 @@ class Product(models.Model):
         verbose_name = 'товар'
         verbose_name_plural = 'товары'
 
+        # filtered pages of catalog API are selected by keyset of id
+        indexes = [
+            models.Index(fields=['category', 'id']),
+            models.Index(fields=['special_status', 'id']),
+        ]
+
     def __str__(self):
         return self.name
 
 
+def recount_changed_products(product_pks):
+    """
+    Update products after bulk change of their menu items like after saving of single items.
+    """
+    from foodcartapp.snapshot import invalidate_catalog
+
+    Product.objects.filter(pk__in=product_pks).recount_available_restaurants()
+    invalidate_catalog()
+
+
+def update_changed_menu_items(menu_items):
+    """
+    Update products, the catalog, the availability index and candidate restaurants of orders
+    after bulk change of menu items like after saving of single items.
+    :param menu_items: set of tuples (restaurant pk, product pk) of changed menu items before and after change
+    """
+    from foodcartapp.candidates import schedule_menu_items_candidates_update
+
+    recount_changed_products({product_pk for _, product_pk in menu_items})
+    transaction.on_commit(partial(refresh_availability_index, menu_items))
+    schedule_menu_items_candidates_update(menu_items)
+
+
+class RestaurantMenuItemQuerySet(models.QuerySet):
+    """
+    Bulk changes of menu items update available_restaurants_count of products, the catalog, the availability index
+    and candidate restaurants of orders like saving of single items.
+    Deleted items are handled by post_delete signal, which is sent by QuerySet.delete too.
+    """
+    # changes of other fields do not change availability of products
+    availability_fields = {'availability', 'product', 'restaurant'}
+
+    def update(self, **kwargs):
+        fields = {self.model._meta.get_field(name).name: value for name, value in kwargs.items()}
+        if not self.availability_fields & fields.keys():
+            return super().update(**kwargs)
+
+        menu_items = set(self.values_list('restaurant', 'product'))
+        updated = super().update(**kwargs)
+
+        restaurant, product = fields.get('restaurant'), fields.get('product')
+        menu_items |= {
+            (
+                getattr(restaurant, 'pk', restaurant) if 'restaurant' in fields else restaurant_pk,
+                getattr(product, 'pk', product) if 'product' in fields else product_pk,
+            )
+            for restaurant_pk, product_pk in menu_items
+        }
+        update_changed_menu_items(menu_items)
+
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        update_changed_menu_items({(obj.restaurant_id, obj.product_id) for obj in objs})
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if not self.availability_fields & set(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+
+        menu_items = {(obj.restaurant_id, obj.product_id) for obj in objs}
+        if {'product', 'restaurant'} & set(fields):
+            menu_items.update(
+                RestaurantMenuItem.objects.filter(
+                    pk__in=[obj.pk for obj in objs],
+                ).values_list('restaurant', 'product')
+            )
+
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        update_changed_menu_items(menu_items)
+        return updated
+
+
 class RestaurantMenuItem(models.Model):
     restaurant = models.ForeignKey(
         Restaurant,
@@ -116,12 +270,18 @@ class RestaurantMenuItem(models.Model):
         db_index=True
     )
 
+    objects = RestaurantMenuItemQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'пункт меню ресторана'
         verbose_name_plural = 'пункты меню ресторана'
         unique_together = [
             ['restaurant', 'product']
         ]
+        # products available in restaurant are read from index only
+        indexes = [
+            models.Index(fields=['restaurant', 'availability', 'product']),
+        ]
 
     def __str__(self):
         return f"{self.restaurant.name} - {self.product.name}"
@@ -141,6 +301,12 @@ class Order(models.Model):
         CARD_ON_SITE = 'SITE', 'Картой на сайте'
         CARD_TO_COURIER = 'CARD', 'Картой курьеру'
 
+    class GeocodeStatus(models.TextChoices):
+        PENDING = 'P', 'Ожидает'
+        FOUND = 'F', 'Найден'
+        NOT_FOUND = 'N', 'Не найден'
+        FAILED = 'E', 'Ошибка геокодера'
+
     first_name = models.CharField(
         verbose_name='Имя',
         max_length=128,
@@ -163,6 +329,36 @@ class Order(models.Model):
         blank=False,
     )
 
+    lng = models.DecimalField(
+        verbose_name='Долгота',
+        max_digits=17,
+        decimal_places=14,
+        validators=[
+            MinValueValidator(-180.0),
+            MaxValueValidator(180.0),
+        ],
+        null=True, blank=True,
+    )
+
+    lat = models.DecimalField(
+        verbose_name='Широта',
+        max_digits=16,
+        decimal_places=14,
+        validators=[
+            MinValueValidator(-90.0),
+            MaxValueValidator(90.0),
+        ],
+        null=True, blank=True,
+    )
+
+    geocode_status = models.CharField(
+        verbose_name='Статус геокодирования',
+        max_length=1,
+        choices=GeocodeStatus.choices,
+        default=GeocodeStatus.PENDING,
+        db_index=True,
+    )
+
     created_at = models.DateTimeField(
         verbose_name='Время заказа',
         auto_now_add=True,
@@ -218,6 +414,12 @@ class Order(models.Model):
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
 
+        # keyset pagination of the order board by (created_at, id) with and without filter by status
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['status', 'created_at', 'id']),
+        ]
+
         constraints = [
             CheckConstraint(
                 check=Q(called_at__gte=F('created_at')) | Q(called_at__isnull=True),
@@ -229,24 +431,29 @@ class Order(models.Model):
             ),
         ]
 
+    @property
+    def coordinates(self):
+        """
+        :return: tuple (lat, lng) or None, when address is not geocoded
+        """
+        if self.lat is None or self.lng is None:
+            return None
+        return self.lat, self.lng
+
+    def save(self, *args, **kwargs):
+        # pre_save signal locks the saved row and changes counters of restaurants in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def get_appropriate_restaurants(self):
         """
+        Restaurants are found by availability index without joins of menu items.
 
         :return: Return queryset of restaurants which can create full order
         """
-        products = self.products.all().values_list('product', flat=True)
-
-        appropriate_restaurants = (
-            Restaurant.objects.filter(
-                menu_items__product__in=products,
-                menu_items__availability=True,
-            ).annotate(
-                req_prod_count=Count('pk'),
-            ).filter(
-                req_prod_count=products.count()
-            )
-        )
-        return appropriate_restaurants
+        products = self.products.values_list('product', flat=True)
+        restaurant_pks = get_availability_index().find_restaurants(products)
+        return Restaurant.objects.filter(pk__in=restaurant_pks)
 
     @staticmethod
     def get_many_orders_appropriate_restaurants(orders):
@@ -256,27 +463,27 @@ class Order(models.Model):
         :param orders: QuerySet of orders for which will found appropriated restaurants
         :return: QuerySet of appropriated restaurants with annotated order_pk - primary key of associated order
         """
-        # products_count need for grouped and select appropriated restaurants
-        orders = orders.select_related().annotate(products_count=Count('products'))
-
-        restaurants_queries = [
-            (
-                Restaurant.objects.filter(
-                    menu_items__product__in=order.products.values_list('product', flat=True),
-                    menu_items__availability=True,
-                ).annotate(
-                    order_pk=Value(order.pk),
-                    req_prod_count=Count('pk'),
-                ).filter(
-                    order_pk=Value(order.pk),
-                    req_prod_count=order.products_count
-                )
-            )
-            for order in orders
-        ]
-
-        appropriate_restaurants_qs = Restaurant.objects.none()
-        appropriate_restaurants_qs = appropriate_restaurants_qs.union(*restaurants_queries, all=True)
+        order_path = 'menu_items__product__productorderquantity__order'
+
+        order_products_count = ProductOrderQuantity.objects.filter(
+            order=OuterRef('order_pk'),
+        ).order_by().values('order').annotate(
+            products_count=Count('product', distinct=True),
+        ).values('products_count')
+
+        # one query for all orders: available menu items are joined with order lines,
+        # grouped by (restaurant, order) and the groups which cover all products of order are kept
+        appropriate_restaurants_qs = Restaurant.objects.filter(
+            menu_items__availability=True,
+            **{f'{order_path}__in': orders},
+        ).annotate(
+            order_pk=F(order_path),
+        ).annotate(
+            req_prod_count=Count('menu_items__product', distinct=True),
+            products_count=Subquery(order_products_count, output_field=models.IntegerField()),
+        ).filter(
+            req_prod_count=F('products_count'),
+        )
         return appropriate_restaurants_qs
 
     def __str__(self):
@@ -321,3 +528,35 @@ class ProductOrderQuantity(models.Model):
 
     def __str__(self):
         return f'{self.product} {self.quantity} шт. (Заказ № {self.order.pk})'
+
+
+class OrderCandidateRestaurant(models.Model):
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='candidate_restaurants',
+        verbose_name='заказ',
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        related_name='candidate_orders',
+        verbose_name='ресторан',
+    )
+    distance_km = models.FloatField(
+        'расстояние, км',
+        null=True, blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'ресторан, который может приготовить заказ'
+        verbose_name_plural = 'рестораны, которые могут приготовить заказы'
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+        indexes = [
+            models.Index(fields=['order', 'distance_km']),
+        ]
+
+    def __str__(self):
+        return f'{self.restaurant} - {self.distance_km} км (Заказ № {self.order_id})'
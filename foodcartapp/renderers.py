@@ -0,0 +1,147 @@
+"""
+Renderers of API responses.
+
+Renderer is selected by Accept header of request among settings.API_RENDERERS, the first one is used by default.
+Renderers with optional dependencies are skipped, when the dependency is not installed:
+orjson for FastJSONRenderer and msgpack for MessagePackRenderer.
+"""
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Decimal, datetime, lazy strings and other Django types are encoded like by JsonResponse
+encode_default = DjangoJSONEncoder().default
+
+
+class Renderer:
+    media_types = ()
+    format = None
+
+    @property
+    def media_type(self) -> str:
+        return self.media_types[0]
+
+    def is_available(self) -> bool:
+        return True
+
+    def render(self, data) -> bytes:
+        raise NotImplementedError('`render()` must be implemented.')
+
+
+class JSONRenderer(Renderer):
+    """
+    Compact JSON by standard library encoder.
+    """
+    media_types = ('application/json',)
+    format = 'json'
+
+    def render(self, data) -> bytes:
+        return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Compact JSON by orjson, the same output as JSONRenderer several times faster.
+    """
+
+    def is_available(self) -> bool:
+        return orjson is not None
+
+    def render(self, data) -> bytes:
+        return orjson.dumps(data, default=encode_default)
+
+
+class MessagePackRenderer(Renderer):
+    media_types = ('application/msgpack', 'application/x-msgpack')
+    format = 'msgpack'
+
+    def is_available(self) -> bool:
+        return msgpack is not None
+
+    def render(self, data) -> bytes:
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+@lru_cache(maxsize=None)
+def get_renderers() -> tuple:
+    renderers = (import_string(path)() for path in settings.API_RENDERERS)
+    return tuple(renderer for renderer in renderers if renderer.is_available())
+
+
+def parse_quality_values(header: str) -> dict:
+    """
+    Parse header with weighted values like Accept or Accept-Encoding.
+    :return: dict {lowercase value: weight}, weight is 1 when it is not passed and 0 when it is invalid
+    """
+    weights = {}
+    for item in header.split(','):
+        value, *params = item.split(';')
+        value = value.strip().lower()
+        if not value:
+            continue
+
+        weight = 1.0
+        for param in params:
+            name, _, param_value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(param_value)
+                except ValueError:
+                    weight = 0
+        weights[value] = weight
+    return weights
+
+
+def get_media_type_weight(media_type: str, accepted: dict) -> float:
+    """
+    :param accepted: parsed Accept header, the most specific matching media range is used
+    """
+    main_type = media_type.split('/')[0]
+    for media_range in (media_type, f'{main_type}/*', '*/*'):
+        if media_range in accepted:
+            return accepted[media_range]
+    return 0
+
+
+def select_renderer(request) -> Renderer:
+    """
+    :return: renderer with the highest weight in Accept header of request, the first one among equal weights,
+        or the first renderer when no one is accepted
+    """
+    renderers = get_renderers()
+    accepted = parse_quality_values(request.headers.get('Accept', ''))
+
+    weights = [
+        max(get_media_type_weight(media_type, accepted) for media_type in renderer.media_types)
+        for renderer in renderers
+    ]
+    best_weight = max(weights)
+    if best_weight <= 0:
+        return renderers[0]
+    return renderers[weights.index(best_weight)]
+
+
+def render_response(request, data, renderer: Renderer = None, **kwargs) -> HttpResponse:
+    """
+    Render data by renderer negotiated with request.
+    :param kwargs: arguments of HttpResponse
+    """
+    renderer = renderer or select_renderer(request)
+    response = HttpResponse(renderer.render(data), content_type=renderer.media_type, **kwargs)
+    patch_vary_headers(response, ['Accept'])
+    return response
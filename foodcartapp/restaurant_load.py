@@ -0,0 +1,78 @@
+"""
+Counters of orders which are assembled or delivered by restaurants.
+
+Restaurant.active_orders_count is changed by atomic increments in the same transaction
+as the orders, so the load of restaurant is read without counting of orders.
+"""
+from collections import Counter
+
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from foodcartapp.models import Order, Restaurant
+
+IN_WORK_STATUSES = (Order.Status.ASSEMBLY, Order.Status.IN_DELIVERY)
+
+
+def get_loaded_restaurant(status: str, restaurant_pk):
+    """
+    :return: primary key of restaurant which is loaded by the order with this status and restaurant, or None
+    """
+    return restaurant_pk if status in IN_WORK_STATUSES else None
+
+
+def change_restaurants_load(deltas: dict):
+    """
+    Change counters of many restaurants by one query.
+    :param deltas: dict {restaurant pk: count of added orders, negative for removed ones}
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+    if not deltas:
+        return
+
+    Restaurant.objects.filter(pk__in=deltas).update(
+        active_orders_count=F('active_orders_count') + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def move_order_load(saved_restaurant_pk, restaurant_pk):
+    """
+    Update counters after change of status or restaurant of one order.
+    :param saved_restaurant_pk: restaurant loaded by the order before change or None
+    :param restaurant_pk: restaurant loaded by the order after change or None
+    """
+    if saved_restaurant_pk == restaurant_pk:
+        return
+
+    deltas = Counter()
+    deltas[saved_restaurant_pk] -= 1
+    deltas[restaurant_pk] += 1
+    change_restaurants_load(deltas)
+
+
+def recount_restaurants_load() -> int:
+    """
+    Recount counters of all restaurants by orders, e.g. after changes of orders by QuerySet.update.
+    :return: count of fixed restaurants
+    """
+    load = dict(
+        Order.objects.filter(
+            status__in=IN_WORK_STATUSES,
+            selected_restaurant__isnull=False,
+        ).values('selected_restaurant').annotate(
+            orders_count=Count('pk'),
+        ).values_list('selected_restaurant', 'orders_count')
+    )
+
+    fixed_restaurants = [
+        restaurant for restaurant in Restaurant.objects.only('active_orders_count')
+        if restaurant.active_orders_count != load.get(restaurant.pk, 0)
+    ]
+    for restaurant in fixed_restaurants:
+        restaurant.active_orders_count = load.get(restaurant.pk, 0)
+    Restaurant.objects.bulk_update(fixed_restaurants, ['active_orders_count'])
+
+    return len(fixed_restaurants)
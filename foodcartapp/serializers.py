@@ -1,4 +1,5 @@
 from copy import deepcopy
+from functools import partial
 
 from django.db import transaction
 from phonenumber_field.serializerfields import PhoneNumberField
@@ -6,6 +7,7 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.fields import CharField, IntegerField, ListField
 from rest_framework.serializers import Serializer
 
+from foodcartapp.geo_tools import schedule_orders_geocoding
 from foodcartapp.models import Product, Order, ProductOrderQuantity
 
 
@@ -58,6 +60,9 @@ class OrderSerializer(Serializer):
 
         ProductOrderQuantity.objects.bulk_create(products_bulk)
 
+        # coordinates and candidate restaurants are stored by background job, so order creation is not slowed down
+        transaction.on_commit(partial(schedule_orders_geocoding, [order.pk]))
+
         return order
 
     @staticmethod
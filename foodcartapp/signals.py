@@ -0,0 +1,180 @@
+import logging
+from functools import partial
+
+import requests
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from foodcartapp.availability_index import update_availability_index, remove_from_availability_index
+from foodcartapp.candidates import update_orders_candidates, update_restaurants_candidates, \
+    schedule_menu_items_candidates_update, remove_closed_orders_candidates
+from foodcartapp.geo_tools import update_restaurants_coordinates
+from foodcartapp.models import Restaurant, RestaurantMenuItem, ProductOrderQuantity, Order, Product, ProductCategory
+from foodcartapp.restaurant_load import get_loaded_restaurant, move_order_load
+from foodcartapp.snapshot import invalidate_catalog
+from foodcartapp.spatial_index import invalidate_restaurants_index
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(pre_save, sender=Restaurant)
+def geocode_restaurant(sender, instance: Restaurant, raw=False, update_fields=None, **kwargs):
+    """
+    Geocode restaurant address when it is changed, so distances never need to geocode restaurants.
+    """
+    if raw or (update_fields is not None and 'address' not in update_fields):
+        return
+
+    saved_address = None
+    if instance.pk:
+        saved_address = Restaurant.objects.filter(pk=instance.pk).values_list('address', flat=True).first()
+
+    if saved_address == instance.address and instance.coordinates:
+        return
+
+    try:
+        update_restaurants_coordinates([instance])
+    except requests.RequestException:
+        # restaurant will be saved without coordinates, they can be filled by geocode_restaurants command
+        logger.exception('Geocoding of restaurant %r failed', instance.address)
+        instance.lat, instance.lng = None, None
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def rebuild_restaurants_index(sender, **kwargs):
+    invalidate_restaurants_index()
+
+
+@receiver(post_delete, sender=Restaurant)
+def remove_restaurant_availability(sender, instance: Restaurant, **kwargs):
+    transaction.on_commit(partial(remove_from_availability_index, instance.pk))
+
+
+@receiver(pre_save, sender=RestaurantMenuItem)
+def remember_replaced_menu_item(sender, instance: RestaurantMenuItem, raw=False, **kwargs):
+    """
+    Menu item can be moved to another product or restaurant, the old product is not available there anymore.
+    The old pair is remembered for post_save receivers.
+    """
+    instance.replaced_item = None
+    if raw or not instance.pk:
+        return
+
+    saved_item = RestaurantMenuItem.objects.filter(pk=instance.pk).values_list('restaurant', 'product').first()
+    if saved_item and saved_item != (instance.restaurant_id, instance.product_id):
+        instance.replaced_item = saved_item
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+def update_menu_item_availability(sender, instance: RestaurantMenuItem, **kwargs):
+    """
+    Index is patched after commit, so rolled back changes never get there.
+    """
+    replaced_item = getattr(instance, 'replaced_item', None)
+    if replaced_item:
+        transaction.on_commit(partial(update_availability_index, *replaced_item, available=False))
+
+    transaction.on_commit(
+        partial(update_availability_index, instance.restaurant_id, instance.product_id, instance.availability)
+    )
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def update_product_availability(sender, instance: RestaurantMenuItem, raw=False, **kwargs):
+    if raw:
+        return
+
+    product_pks = {instance.product_id}
+    replaced_item = getattr(instance, 'replaced_item', None)
+    if replaced_item:
+        product_pks.add(replaced_item[1])
+
+    Product.objects.filter(pk__in=product_pks).recount_available_restaurants()
+
+
+@receiver(post_delete, sender=RestaurantMenuItem)
+def remove_menu_item_availability(sender, instance: RestaurantMenuItem, **kwargs):
+    transaction.on_commit(
+        partial(update_availability_index, instance.restaurant_id, instance.product_id, available=False)
+    )
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def update_menu_item_candidates(sender, instance: RestaurantMenuItem, raw=False, **kwargs):
+    if raw:
+        return
+
+    menu_items = {(instance.restaurant_id, instance.product_id)}
+    replaced_item = getattr(instance, 'replaced_item', None)
+    if replaced_item:
+        menu_items.add(replaced_item)
+
+    schedule_menu_items_candidates_update(menu_items)
+
+
+@receiver(post_save, sender=Restaurant)
+def update_restaurant_distances(sender, instance: Restaurant, created=False, raw=False, update_fields=None, **kwargs):
+    if created or raw or (update_fields is not None and 'address' not in update_fields):
+        return
+    transaction.on_commit(partial(update_restaurants_candidates, [instance.pk]))
+
+
+@receiver(post_save, sender=ProductOrderQuantity)
+@receiver(post_delete, sender=ProductOrderQuantity)
+def update_order_lines_candidates(sender, instance: ProductOrderQuantity, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(partial(update_orders_candidates, [instance.order_id]))
+
+
+@receiver(post_save, sender=Order)
+def remove_closed_order_candidates(sender, instance: Order, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'status' not in update_fields):
+        return
+    if instance.status in (Order.Status.FINISHED, Order.Status.CANCELED):
+        remove_closed_orders_candidates([instance.pk])
+
+
+@receiver(pre_save, sender=Order)
+def update_restaurants_load(sender, instance: Order, raw=False, update_fields=None, **kwargs):
+    """
+    Move the order between counters of restaurants, when its status or restaurant is changed.
+    Order.save runs in transaction, the saved row is locked until commit, so concurrent changes
+    of the order, e.g. by dispatcher, are not counted twice.
+    """
+    if raw or (update_fields is not None and not {'status', 'selected_restaurant'} & set(update_fields)):
+        return
+
+    saved_restaurant_pk = None
+    if instance.pk:
+        saved_order = Order.objects.select_for_update().filter(
+            pk=instance.pk,
+        ).values_list('status', 'selected_restaurant').first()
+        if saved_order:
+            saved_restaurant_pk = get_loaded_restaurant(*saved_order)
+
+    move_order_load(saved_restaurant_pk, get_loaded_restaurant(instance.status, instance.selected_restaurant_id))
+
+
+@receiver(pre_delete, sender=Order)
+def unload_restaurant(sender, instance: Order, **kwargs):
+    # pre_delete is sent in transaction of deletion, the saved row is read instead of possibly stale instance
+    saved_order = Order.objects.select_for_update().filter(
+        pk=instance.pk,
+    ).values_list('status', 'selected_restaurant').first()
+    if saved_order:
+        move_order_load(get_loaded_restaurant(*saved_order), None)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def invalidate_changed_catalog(sender, **kwargs):
+    invalidate_catalog()
@@ -0,0 +1,262 @@
+"""
+Precomputed snapshot of the whole product catalog.
+
+Snapshot is rendered by every API renderer and compressed by gzip and brotli once after change of the catalog.
+Files of snapshot are immutable and named by its version, the current version is written to the pointer file,
+so all processes serve the same snapshot. The pointer is switched only to a newer version, so a build which
+has read the catalog earlier but finished later does not bring back old content.
+Served files are memory-mapped and requests do not access database.
+ETag is a hash of content, so periodic rebuilds of unchanged catalog do not invalidate copies of clients.
+Snapshot older than settings.CATALOG_CACHE_TIMEOUT seconds is rebuilt for changes which are not signalled.
+Brotli variant is built only when brotli package is installed.
+"""
+import fcntl
+import gzip
+import hashlib
+import logging
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.http import quote_etag
+
+from cache_address_app.concurrency import close_db_connection_after
+from foodcartapp.catalog import bump_catalog_version, dump_products
+from foodcartapp.models import Product
+from foodcartapp.renderers import get_renderers, parse_quality_values
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+POINTER_FILE = 'products.current'
+# the pointer is compared and switched under this lock by all processes
+POINTER_LOCK_FILE = 'products.lock'
+# old snapshots are kept for processes which have not switched to the current one yet
+KEPT_SNAPSHOTS = 3
+
+# maximal levels are several times slower and save only a few percents of the catalog size
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+COMPRESSORS = {
+    'br': (lambda content: brotli.compress(content, quality=BROTLI_QUALITY)) if brotli else None,
+    'gzip': lambda content: gzip.compress(content, compresslevel=GZIP_LEVEL),
+    'identity': lambda content: content,
+}
+
+
+def get_snapshot_dir() -> Path:
+    return Path(settings.CATALOG_SNAPSHOT_DIR)
+
+
+def get_snapshot_path(version: str, format: str, encoding: str) -> Path:
+    return get_snapshot_dir() / f'products-{version}.{format}.{encoding}'
+
+
+def write_atomically(path: Path, content: bytes):
+    temporary_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    temporary_path.write_bytes(content)
+    os.replace(temporary_path, path)
+
+
+def read_current_version():
+    """
+    :return: version of the current snapshot or None, when snapshot is not built yet
+    """
+    try:
+        return (get_snapshot_dir() / POINTER_FILE).read_text()
+    except FileNotFoundError:
+        return None
+
+
+def make_current(version: str) -> bool:
+    """
+    Switch the pointer file to the version, unless a newer snapshot is current already.
+    :return: True when the pointer is switched
+    """
+    with open(get_snapshot_dir() / POINTER_LOCK_FILE, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        current_version = read_current_version()
+        if current_version is not None and int(current_version) >= int(version):
+            return False
+
+        write_atomically(get_snapshot_dir() / POINTER_FILE, version.encode())
+        return True
+
+
+def remove_snapshot(version: str):
+    for path in get_snapshot_dir().glob(f'products-{version}.*'):
+        path.unlink(missing_ok=True)
+
+
+_build_lock = Lock()
+
+
+def build_snapshot() -> str:
+    """
+    Render the catalog, store all its variants and make the snapshot current.
+    :return: version of the current snapshot, it is not the built one when a newer snapshot is current already
+    """
+    with _build_lock:
+        version = str(time.time_ns())
+        products = dump_products(Product.objects.select_related('category').available())
+
+        get_snapshot_dir().mkdir(parents=True, exist_ok=True)
+        # the first renderer of every format is used, like by select_renderer
+        formats = {renderer.format: renderer for renderer in reversed(get_renderers())}
+        for format, renderer in formats.items():
+            content = renderer.render(products)
+            for encoding, compress in COMPRESSORS.items():
+                if compress:
+                    write_atomically(get_snapshot_path(version, format, encoding), compress(content))
+
+        if not make_current(version):
+            remove_snapshot(version)
+        remove_old_snapshots()
+
+    return read_current_version()
+
+
+def remove_old_snapshots():
+    current_version = read_current_version()
+    versions = sorted(
+        {path.name.split('.')[0].split('-')[1] for path in get_snapshot_dir().glob('products-*')},
+        key=int,
+    )
+    for version in versions[:-KEPT_SNAPSHOTS]:
+        if version != current_version:
+            remove_snapshot(version)
+
+
+class Snapshot:
+    def __init__(self, version: str):
+        self.version = version
+        self.last_modified = int(version) // 10 ** 9
+        self.variants = {}
+
+        for path in get_snapshot_dir().glob(f'products-{version}.*'):
+            _, format, encoding = path.name.split('.')
+            with path.open('rb') as snapshot_file:
+                self.variants[format, encoding] = memoryview(
+                    mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+                )
+
+        # hashes are computed once per process, compressed variants of the same content share the hash
+        self.content_hashes = {
+            format: hashlib.blake2b(content, digest_size=16).hexdigest()
+            for (format, encoding), content in self.variants.items()
+            if encoding == 'identity'
+        }
+
+    def get_encodings(self, format: str) -> list:
+        """
+        :return: encodings of the format, more compact first
+        """
+        return [encoding for encoding in COMPRESSORS if (format, encoding) in self.variants]
+
+    def get_content(self, format: str, encoding: str):
+        return self.variants.get((format, encoding))
+
+    def get_etag(self, format: str, encoding: str) -> str:
+        # every encoding has own bytes, so strong ETag differs by encoding
+        return quote_etag(f'{self.content_hashes[format]}-{encoding}')
+
+
+_snapshot = None
+_snapshot_lock = Lock()
+
+
+def get_current_snapshot():
+    """
+    :return: current Snapshot or None, when snapshot is not built yet.
+        Only the pointer file is read, while the snapshot is not changed.
+        Expired snapshot is returned as is and rebuilt in background
+    """
+    global _snapshot
+
+    version = read_current_version()
+    if version is None:
+        return None
+
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = Snapshot(version)
+        snapshot = _snapshot
+
+    if snapshot.last_modified + settings.CATALOG_CACHE_TIMEOUT < time.time():
+        schedule_snapshot_build()
+
+    return snapshot
+
+
+def select_encoding(accept_encoding: str, encodings) -> str:
+    """
+    Select content coding by Accept-Encoding header, the first of encodings is preferred on equal weights.
+    """
+    weights = parse_quality_values(accept_encoding)
+
+    def get_weight(encoding):
+        # identity is acceptable, unless it is excluded explicitly, but any listed coding is preferred
+        return weights.get(encoding, weights.get('*', 0.001 if encoding == 'identity' else 0))
+
+    acceptable = [encoding for encoding in encodings if get_weight(encoding) > 0]
+    if not acceptable:
+        return 'identity'
+
+    return max(acceptable, key=get_weight)
+
+
+_build_executor = None
+_build_pending = False
+_build_state_lock = Lock()
+
+
+def build_pending_snapshot():
+    global _build_pending
+
+    with _build_state_lock:
+        # changes committed from now on are not seen by this build, they schedule the next one
+        _build_pending = False
+
+    try:
+        build_snapshot()
+    except Exception:
+        logger.exception('Build of catalog snapshot failed')
+
+
+def schedule_snapshot_build():
+    """
+    Build snapshot in background. Call it after commit of changes of the catalog.
+    Snapshots are built one at a time on own thread, not on the geocoder pool, and builds scheduled
+    while the previous one is waiting are merged, so many changes cause one build after the running one.
+    """
+    global _build_executor, _build_pending
+
+    with _build_state_lock:
+        if _build_pending:
+            return
+        _build_pending = True
+
+        if _build_executor is None:
+            _build_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='snapshot')
+
+    _build_executor.submit(close_db_connection_after(build_pending_snapshot))
+
+
+def invalidate_catalog():
+    """
+    Drop cached pages of the catalog and rebuild its snapshot after commit of changes of the catalog,
+    when the changes are visible for other connections.
+    """
+    transaction.on_commit(bump_catalog_version)
+    transaction.on_commit(schedule_snapshot_build)
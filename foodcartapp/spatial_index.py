@@ -0,0 +1,151 @@
+"""
+Spatial index of restaurants for k nearest and radius queries.
+
+Points are placed on a sphere of mean Earth radius in 3D cartesian coordinates and grouped by cubic cells.
+Straight (chord) distance between points is never greater than the great-circle one, so cells which are
+farther than the current k-th candidate by chord are skipped without distance evaluation.
+Returned distances are great-circle (haversine) distances in kilometers.
+"""
+import math
+import time
+from collections import defaultdict
+from itertools import product
+from threading import Lock
+
+from django.conf import settings
+
+from foodcartapp.distance_matrix import EARTH_RADIUS_KM
+
+
+def to_cartesian(point) -> tuple:
+    lat, lng = map(math.radians, map(float, point))
+    return (
+        EARTH_RADIUS_KM * math.cos(lat) * math.cos(lng),
+        EARTH_RADIUS_KM * math.cos(lat) * math.sin(lng),
+        EARTH_RADIUS_KM * math.sin(lat),
+    )
+
+
+def chord_to_arc(chord_km: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord_km / (2 * EARTH_RADIUS_KM), 1))
+
+
+class SpatialIndex:
+    # farther cells are not scanned one by one, all remaining points are checked instead
+    max_rings = 20
+
+    def __init__(self, points: dict, cell_km: float):
+        """
+        :param points: dict {key: (lat, lng)}
+        :param cell_km: size of cell edge in kilometers
+        """
+        self.cell_km = cell_km
+        self.points = {key: to_cartesian(point) for key, point in points.items()}
+        self.cells = defaultdict(list)
+
+        for key, xyz in self.points.items():
+            self.cells[self.get_cell(xyz)].append(key)
+
+    def __len__(self):
+        return len(self.points)
+
+    def get_cell(self, xyz) -> tuple:
+        return tuple(math.floor(coordinate / self.cell_km) for coordinate in xyz)
+
+    def iterate_ring(self, center, ring: int):
+        """
+        Cells on the surface of cube with center cell and edge of 2 * ring + 1 cells.
+        """
+        offsets = range(-ring, ring + 1)
+        for offset in product(offsets, repeat=3):
+            if max(map(abs, offset)) == ring:
+                yield tuple(c + o for c, o in zip(center, offset))
+
+    def nearest(self, point, k: int = None, radius_km: float = None, keys=None) -> list:
+        """
+        Find nearest points.
+        :param point: tuple (lat, lng)
+        :param k: max count of found points, unlimited by default
+        :param radius_km: max distance to found points, unlimited by default
+        :param keys: search only among these keys
+        :return: list of tuples (key, distance in kilometers) sorted by distance
+        """
+        xyz = to_cartesian(point)
+        keys = set(self.points) if keys is None else set(keys) & self.points.keys()
+        max_chord = 2 * EARTH_RADIUS_KM * math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2) \
+            if radius_km is not None else math.inf
+
+        found = []
+        checked = 0
+        center = self.get_cell(xyz)
+
+        def check(candidates):
+            nonlocal checked
+            for key in candidates:
+                if key not in keys:
+                    continue
+                checked += 1
+                chord = math.dist(xyz, self.points[key])
+                if chord <= max_chord:
+                    found.append((chord, key))
+
+        ring = 0
+        while checked < len(keys):
+            # points in this ring and farther are not closer than this
+            min_chord = max(ring - 1, 0) * self.cell_km
+            if min_chord > max_chord:
+                break
+            if k is not None and len(found) >= k and sorted(found)[k - 1][0] <= min_chord:
+                break
+
+            if ring > self.max_rings:
+                scanned = {
+                    key for cell, cell_keys in self.cells.items()
+                    if max(abs(c - o) for c, o in zip(cell, center)) < ring
+                    for key in cell_keys
+                }
+                check(keys - scanned)
+                break
+
+            for cell in self.iterate_ring(center, ring):
+                check(self.cells.get(cell, ()))
+            ring += 1
+
+        found.sort()
+        return [(key, chord_to_arc(chord)) for chord, key in found[:k]]
+
+
+_restaurants_index = None
+_restaurants_index_built_at = None
+_restaurants_index_lock = Lock()
+
+
+def get_restaurants_index() -> SpatialIndex:
+    """
+    Spatial index of geocoded restaurants, keys are primary keys of restaurants.
+    Index is rebuilt after changes of restaurants in current process
+    and every settings.RESTAURANTS_INDEX_TTL seconds for changes made by other processes.
+    """
+    global _restaurants_index, _restaurants_index_built_at
+    from foodcartapp.models import Restaurant
+
+    with _restaurants_index_lock:
+        expired = _restaurants_index_built_at is None or \
+            _restaurants_index_built_at + settings.RESTAURANTS_INDEX_TTL < time.monotonic()
+
+        if _restaurants_index is None or expired:
+            restaurants = Restaurant.objects.filter(lat__isnull=False, lng__isnull=False).values_list('pk', 'lat', 'lng')
+            _restaurants_index = SpatialIndex(
+                {pk: (lat, lng) for pk, lat, lng in restaurants},
+                cell_km=settings.RESTAURANTS_INDEX_CELL_KM,
+            )
+            _restaurants_index_built_at = time.monotonic()
+
+        return _restaurants_index
+
+
+def invalidate_restaurants_index():
+    global _restaurants_index
+
+    with _restaurants_index_lock:
+        _restaurants_index = None
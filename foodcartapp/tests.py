@@ -0,0 +1,616 @@
+import gzip
+import json
+import math
+import random
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+import requests
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from cache_address_app.memory_cache import geodata_cache
+from foodcartapp import availability_index, candidates, snapshot
+from foodcartapp.dispatcher import assign_greedy, dispatch_orders
+from foodcartapp.distance_matrix import EARTH_RADIUS_KM
+from foodcartapp.geo_tools import geocode_orders
+from foodcartapp.geocoders import CircuitBreaker, CircuitOpenError
+from foodcartapp.models import (
+    Order, OrderCandidateRestaurant, Product, ProductCategory, ProductOrderQuantity, Restaurant, RestaurantMenuItem,
+)
+from foodcartapp.renderers import JSONRenderer, MessagePackRenderer, parse_quality_values, select_renderer
+from foodcartapp.restaurant_load import recount_restaurants_load
+from foodcartapp.snapshot import build_snapshot, select_encoding
+from foodcartapp.spatial_index import SpatialIndex
+
+
+class CatalogTestCase(TestCase):
+    """
+    Two geocoded restaurants with all products available and two open orders.
+    Snapshot of the catalog is not built by callbacks on commit.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        cls.products = [
+            Product.objects.create(name=f'Бургер {number}', price=100 + number, image='burger.png', category=category)
+            for number in range(3)
+        ]
+        # restaurants are created without signals, so they are not geocoded
+        Restaurant.objects.bulk_create([
+            Restaurant(name=f'Ресторан {number}', address=f'Москва, {number}', lat=55.7 + number / 100, lng=37.6)
+            for number in range(2)
+        ])
+        cls.restaurants = list(Restaurant.objects.order_by('pk'))
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant=restaurant, product=product, availability=True)
+            for restaurant in cls.restaurants
+            for product in cls.products
+        ])
+        cls.orders = [
+            Order.objects.create(
+                first_name='Иван', last_name='Иванов', phone_number='+79291000000', address=f'Москва, {number}',
+                lat=55.75, lng=37.6, geocode_status=Order.GeocodeStatus.FOUND,
+            )
+            for number in range(2)
+        ]
+        ProductOrderQuantity.objects.bulk_create([
+            ProductOrderQuantity(order=cls.orders[0], product=cls.products[0], quantity=1, frozen_price=100),
+            ProductOrderQuantity(order=cls.orders[0], product=cls.products[1], quantity=1, frozen_price=101),
+            ProductOrderQuantity(order=cls.orders[1], product=cls.products[2], quantity=2, frozen_price=102),
+        ])
+
+    def setUp(self):
+        patcher = mock.patch('foodcartapp.snapshot.schedule_snapshot_build')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_menu_item(self, restaurant: int, product: int) -> RestaurantMenuItem:
+        return RestaurantMenuItem.objects.get(restaurant=self.restaurants[restaurant], product=self.products[product])
+
+
+def haversine(source_point, destination_point) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (*source_point, *destination_point))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class SpatialIndexTest(SimpleTestCase):
+    def setUp(self):
+        generator = random.Random(0)
+        # restaurants of a city and a few far ones, which are found by fallback after max_rings
+        self.points = {
+            pk: (55.75 + generator.uniform(-0.3, 0.3), 37.62 + generator.uniform(-0.5, 0.5))
+            for pk in range(200)
+        }
+        self.points.update({1000: (59.93, 30.31), 1001: (43.12, 131.89), 1002: (-33.87, 151.21)})
+        self.index = SpatialIndex(self.points, cell_km=2)
+        self.queries = [(55.75 + generator.uniform(-0.4, 0.4), 37.62 + generator.uniform(-0.6, 0.6)) for _ in range(20)]
+
+    def find_brute_force(self, point, k=None, radius_km=None, keys=None):
+        distances = sorted(
+            (haversine(point, self.points[key]), key) for key in (self.points if keys is None else keys)
+        )
+        return [(key, distance) for distance, key in distances if radius_km is None or distance <= radius_km][:k]
+
+    def assertSameNearest(self, found, expected):
+        self.assertEqual([key for key, _ in found], [key for key, _ in expected])
+        for (_, distance), (_, expected_distance) in zip(found, expected):
+            self.assertAlmostEqual(distance, expected_distance, places=6)
+
+    def test_k_nearest(self):
+        for point in self.queries:
+            for k in (1, 5, 30):
+                self.assertSameNearest(self.index.nearest(point, k=k), self.find_brute_force(point, k=k))
+
+    def test_radius(self):
+        for point in self.queries:
+            for radius_km in (0.5, 3, 15):
+                self.assertSameNearest(
+                    self.index.nearest(point, radius_km=radius_km),
+                    self.find_brute_force(point, radius_km=radius_km),
+                )
+
+    def test_k_within_radius_among_keys(self):
+        keys = list(range(0, 200, 7)) + [1000]
+        for point in self.queries:
+            self.assertSameNearest(
+                self.index.nearest(point, k=3, radius_km=10, keys=keys),
+                self.find_brute_force(point, k=3, radius_km=10, keys=keys),
+            )
+
+    def test_far_points_are_found_after_max_rings(self):
+        point = self.queries[0]
+        self.assertSameNearest(
+            self.index.nearest(point, keys=[1000, 1001, 1002]),
+            self.find_brute_force(point, keys=[1000, 1001, 1002]),
+        )
+        self.assertSameNearest(self.index.nearest(point), self.find_brute_force(point))
+
+    def test_unknown_keys_are_skipped(self):
+        self.assertEqual(self.index.nearest(self.queries[0], keys=[-1, -2]), [])
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch('foodcartapp.geocoders.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(max_failures=2, cooldown=30)
+
+    def fail(self):
+        raise requests.ConnectionError('geocoder is down')
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                self.breaker.call(self.fail)
+
+        func = mock.Mock()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(func)
+        func.assert_not_called()
+
+    def test_success_resets_failures(self):
+        with self.assertRaises(requests.ConnectionError):
+            self.breaker.call(self.fail)
+        self.assertEqual(self.breaker.call(lambda: 'ok'), 'ok')
+        with self.assertRaises(requests.ConnectionError):
+            self.breaker.call(self.fail)
+
+        self.assertFalse(self.breaker.is_open)
+
+    def test_trial_call_after_cooldown(self):
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                self.breaker.call(self.fail)
+
+        self.now += 31
+        with self.assertRaises(requests.ConnectionError):
+            self.breaker.call(self.fail)
+        self.assertTrue(self.breaker.is_open)
+
+        self.now += 31
+        self.assertEqual(self.breaker.call(lambda: 'ok'), 'ok')
+        self.assertFalse(self.breaker.is_open)
+
+
+class GeocodeOrdersTest(TransactionTestCase):
+    def setUp(self):
+        geodata_cache.clear()
+        self.addCleanup(geodata_cache.clear)
+
+    def geocode(self, api_key, address):
+        if address == 'Москва, bad request':
+            raise requests.HTTPError('400 Client Error')
+        if address == 'Москва, broken response':
+            raise KeyError('GeoObjectCollection')
+        return 37.6, 55.7
+
+    def test_only_orders_with_failed_addresses_are_failed(self):
+        for timeout in (None, 5):
+            with self.subTest(timeout=timeout):
+                geodata_cache.clear()
+                orders = [
+                    Order(pk=number, address=address)
+                    for number, address in enumerate(['Москва, bad request', 'Москва, broken response', 'Москва, 1'])
+                ]
+
+                with mock.patch('foodcartapp.geo_tools.geocode', self.geocode):
+                    changed_orders = geocode_orders(orders, timeout=timeout)
+
+                self.assertCountEqual(changed_orders, orders)
+                self.assertEqual(
+                    [order.geocode_status for order in orders],
+                    [Order.GeocodeStatus.FAILED, Order.GeocodeStatus.FAILED, Order.GeocodeStatus.FOUND],
+                )
+                self.assertEqual(tuple(map(float, orders[2].coordinates)), (55.7, 37.6))
+
+
+class CandidatesTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        candidates.update_orders_candidates([order.pk for order in self.orders])
+
+    def get_candidates(self, order: Order) -> set:
+        return set(OrderCandidateRestaurant.objects.filter(order=order).values_list('restaurant', flat=True))
+
+    def test_candidates_are_stored_with_distances(self):
+        self.assertEqual(self.get_candidates(self.orders[0]), {restaurant.pk for restaurant in self.restaurants})
+        self.assertFalse(OrderCandidateRestaurant.objects.filter(distance_km__isnull=True).exists())
+
+    def test_saved_menu_item_updates_candidates(self):
+        menu_item = self.get_menu_item(1, 1)
+        menu_item.availability = False
+        with self.captureOnCommitCallbacks(execute=True):
+            menu_item.save()
+
+        self.assertEqual(self.get_candidates(self.orders[0]), {self.restaurants[0].pk})
+        self.assertEqual(len(self.get_candidates(self.orders[1])), 2)
+
+    def test_bulk_changes_of_menu_items_update_candidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.filter(
+                restaurant=self.restaurants[1], product=self.products[1],
+            ).update(availability=False)
+        self.assertEqual(self.get_candidates(self.orders[0]), {self.restaurants[0].pk})
+
+        menu_item = self.get_menu_item(1, 1)
+        menu_item.availability = True
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.bulk_update([menu_item], ['availability'])
+        self.assertEqual(len(self.get_candidates(self.orders[0])), 2)
+
+        RestaurantMenuItem.objects.filter(restaurant=self.restaurants[1], product=self.products[2]).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.bulk_create([
+                RestaurantMenuItem(restaurant=self.restaurants[1], product=self.products[2], availability=True),
+            ])
+        self.assertEqual(len(self.get_candidates(self.orders[1])), 2)
+
+    def test_menu_items_of_transaction_are_updated_once(self):
+        with mock.patch.object(candidates, 'update_candidates', wraps=candidates.update_candidates) as update:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for menu_item in RestaurantMenuItem.objects.all():
+                        menu_item.availability = False
+                        menu_item.save()
+
+        self.assertEqual(update.call_count, 1)
+        self.assertFalse(OrderCandidateRestaurant.objects.exists())
+
+    def test_candidates_of_closed_order_are_removed(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        order.status = Order.Status.CANCELED
+        order.save()
+
+        self.assertFalse(self.get_candidates(order))
+        self.assertTrue(self.get_candidates(self.orders[1]))
+
+
+class AvailabilityIndexTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.multiple(availability_index, _availability_index=None, _availability_index_built_at=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.products_pks = [product.pk for product in self.products]
+
+    def find_restaurants(self) -> set:
+        return set(availability_index.get_availability_index().find_restaurants(self.products_pks))
+
+    def test_index_is_patched_after_commit(self):
+        self.assertEqual(len(self.find_restaurants()), 2)
+
+        menu_item = self.get_menu_item(1, 0)
+        menu_item.availability = False
+        with self.captureOnCommitCallbacks(execute=True):
+            menu_item.save()
+            self.assertEqual(len(self.find_restaurants()), 2)
+
+        self.assertEqual(self.find_restaurants(), {self.restaurants[0].pk})
+
+    def test_rolled_back_change_is_not_indexed(self):
+        self.find_restaurants()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                RestaurantMenuItem.objects.filter(restaurant=self.restaurants[1]).delete()
+                raise RuntimeError
+
+        self.assertFalse(callbacks)
+        self.assertEqual(len(self.find_restaurants()), 2)
+
+    def test_bulk_changes_are_indexed(self):
+        self.find_restaurants()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.filter(restaurant=self.restaurants[0], product=self.products[2]).update(
+                availability=False,
+            )
+        self.assertEqual(self.find_restaurants(), {self.restaurants[1].pk})
+
+        menu_item = self.get_menu_item(0, 2)
+        menu_item.availability = True
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.bulk_update([menu_item], ['availability'])
+        self.assertEqual(len(self.find_restaurants()), 2)
+
+
+class ProductsAvailabilityTest(CatalogTestCase):
+    def get_counts(self) -> list:
+        return [Product.objects.get(pk=product.pk).available_restaurants_count for product in self.products]
+
+    def test_counts_follow_saved_and_deleted_menu_items(self):
+        self.assertEqual(self.get_counts(), [2, 2, 2])
+
+        menu_item = self.get_menu_item(0, 0)
+        menu_item.availability = False
+        menu_item.save()
+        self.get_menu_item(1, 1).delete()
+
+        self.assertEqual(self.get_counts(), [1, 1, 2])
+        self.assertEqual(list(Product.objects.available()), self.products)
+
+    def test_counts_follow_bulk_changes(self):
+        RestaurantMenuItem.objects.filter(product=self.products[0]).update(availability=False)
+        self.assertEqual(self.get_counts(), [0, 2, 2])
+        self.assertNotIn(self.products[0], Product.objects.available())
+
+        self.get_menu_item(0, 0).delete()
+        menu_item = self.get_menu_item(0, 1)
+        menu_item.product = self.products[0]
+        RestaurantMenuItem.objects.bulk_update([menu_item], ['product'])
+        self.assertEqual(self.get_counts(), [1, 1, 2])
+
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant=self.restaurants[0], product=self.products[1], availability=True),
+        ])
+        self.assertEqual(self.get_counts(), [1, 2, 2])
+
+    def test_command_fixes_wrong_counts_and_invalidates_catalog(self):
+        Product.objects.filter(pk=self.products[0].pk).update(available_restaurants_count=5)
+
+        with mock.patch('foodcartapp.snapshot.invalidate_catalog') as invalidate_catalog:
+            call_command('recount_products_availability', '--dry-run', stdout=StringIO())
+            self.assertEqual(self.get_counts(), [5, 2, 2])
+            invalidate_catalog.assert_not_called()
+
+            call_command('recount_products_availability', stdout=StringIO())
+
+        self.assertEqual(self.get_counts(), [2, 2, 2])
+        invalidate_catalog.assert_called_once_with()
+
+
+class SelectEncodingTest(SimpleTestCase):
+    encodings = ['br', 'gzip', 'identity']
+
+    def test_weights(self):
+        self.assertEqual(select_encoding('gzip;q=0.5, br;q=0.9', self.encodings), 'br')
+        self.assertEqual(select_encoding('gzip, deflate', self.encodings), 'gzip')
+
+    def test_more_compact_is_preferred_on_equal_weights(self):
+        self.assertEqual(select_encoding('gzip, br', self.encodings), 'br')
+        self.assertEqual(select_encoding('*', self.encodings), 'br')
+
+    def test_identity(self):
+        self.assertEqual(select_encoding('', self.encodings), 'identity')
+        self.assertEqual(select_encoding('br;q=0, gzip;q=0', self.encodings), 'identity')
+        self.assertEqual(select_encoding('identity;q=0, gzip', self.encodings), 'gzip')
+
+
+class SnapshotTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        settings_override = override_settings(CATALOG_SNAPSHOT_DIR=snapshot_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch.object(snapshot, '_snapshot', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        build_snapshot()
+
+    def get_products(self, **headers):
+        return self.client.get('/api/products/', HTTP_ACCEPT='application/json', **headers)
+
+    def test_snapshot_is_served_without_queries(self):
+        with self.assertNumQueries(0):
+            response = self.get_products(HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        products = json.loads(gzip.decompress(response.content))
+        self.assertCountEqual([product['id'] for product in products], [product.pk for product in self.products])
+
+    def test_conditional_request_is_not_modified(self):
+        etag = self.get_products()['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.get_products(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.get_products(HTTP_ACCEPT_ENCODING='gzip')['ETag'], etag)
+
+    def test_etag_is_kept_by_rebuild_of_unchanged_catalog(self):
+        etag = self.get_products()['ETag']
+
+        with mock.patch('foodcartapp.snapshot.time.time_ns', return_value=time.time_ns() + 10 ** 12):
+            build_snapshot()
+        self.assertEqual(self.get_products(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Product.objects.filter(pk=self.products[0].pk).update(price=500)
+        with mock.patch('foodcartapp.snapshot.time.time_ns', return_value=time.time_ns() + 2 * 10 ** 12):
+            build_snapshot()
+        response = self.get_products(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ManyOrdersAppropriateRestaurantsTest(CatalogTestCase):
+    def get_pairs(self, orders) -> set:
+        with self.assertNumQueries(1):
+            return {
+                (restaurant.pk, restaurant.order_pk)
+                for restaurant in Order.get_many_orders_appropriate_restaurants(orders)
+            }
+
+    def test_restaurants_have_all_products_of_order(self):
+        RestaurantMenuItem.objects.filter(restaurant=self.restaurants[1], product=self.products[1]).update(
+            availability=False,
+        )
+        restaurant, other_restaurant = self.restaurants
+        order, other_order = self.orders
+
+        self.assertEqual(
+            self.get_pairs(Order.objects.all()),
+            {(restaurant.pk, order.pk), (restaurant.pk, other_order.pk), (other_restaurant.pk, other_order.pk)},
+        )
+        self.assertEqual(self.get_pairs(Order.objects.filter(pk=order.pk)), {(restaurant.pk, order.pk)})
+
+    def test_order_without_products_has_no_restaurants(self):
+        ProductOrderQuantity.objects.filter(order=self.orders[1]).delete()
+        self.assertEqual(self.get_pairs(Order.objects.filter(pk=self.orders[1].pk)), set())
+
+
+class AssignGreedyTest(SimpleTestCase):
+    def test_nearest_pairs_are_assigned_first(self):
+        candidates = [
+            (1, 'a', 1.0),
+            (1, 'b', 2.0),
+            (2, 'a', 0.5),
+            (2, 'b', 3.0),
+            (3, 'b', 4.0),
+        ]
+        self.assertEqual(
+            assign_greedy(candidates, {'a': 1, 'b': 2}),
+            {2: 'a', 1: 'b', 3: 'b'},
+        )
+
+    def test_capacity_is_respected_and_not_changed(self):
+        capacity = {'a': 1, 'b': 0}
+        assignments = assign_greedy([(1, 'a', 1.0), (2, 'a', 2.0), (3, 'b', 0.1), (4, 'c', 0.1)], capacity)
+
+        self.assertEqual(assignments, {1: 'a'})
+        self.assertEqual(capacity, {'a': 1, 'b': 0})
+
+
+class DispatchOrdersTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        candidates.update_orders_candidates([order.pk for order in self.orders])
+
+    def test_orders_are_assigned_within_capacity(self):
+        restaurant, nearest_restaurant = self.restaurants
+        Restaurant.objects.filter(pk=nearest_restaurant.pk).update(max_active_orders=1)
+
+        self.assertEqual(dispatch_orders([order.pk for order in self.orders]), 2)
+
+        orders = Order.objects.filter(pk__in=[order.pk for order in self.orders])
+        self.assertCountEqual(
+            orders.values_list('selected_restaurant', 'status'),
+            [(restaurant.pk, Order.Status.ASSEMBLY), (nearest_restaurant.pk, Order.Status.ASSEMBLY)],
+        )
+        self.assertEqual(dispatch_orders([order.pk for order in self.orders]), 0)
+
+    def test_orders_without_free_restaurants_are_left(self):
+        Restaurant.objects.update(max_active_orders=0)
+
+        self.assertEqual(dispatch_orders([order.pk for order in self.orders]), 0)
+        self.assertFalse(Order.objects.filter(selected_restaurant__isnull=False).exists())
+
+
+class RestaurantsLoadTest(CatalogTestCase):
+    def get_load(self) -> list:
+        return list(Restaurant.objects.order_by('pk').values_list('active_orders_count', flat=True))
+
+    def test_counters_follow_saved_orders(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        order.selected_restaurant = self.restaurants[0]
+        order.save()
+        self.assertEqual(self.get_load(), [0, 0])
+
+        order.status = Order.Status.ASSEMBLY
+        order.save()
+        self.assertEqual(self.get_load(), [1, 0])
+
+        order.selected_restaurant = self.restaurants[1]
+        order.status = Order.Status.IN_DELIVERY
+        order.save()
+        self.assertEqual(self.get_load(), [0, 1])
+
+        order.status = Order.Status.FINISHED
+        order.save()
+        self.assertEqual(self.get_load(), [0, 0])
+
+    def test_counters_follow_deleted_and_dispatched_orders(self):
+        candidates.update_orders_candidates([order.pk for order in self.orders])
+        dispatch_orders([order.pk for order in self.orders])
+        self.assertEqual(sum(self.get_load()), 2)
+
+        Order.objects.get(pk=self.orders[0].pk).delete()
+        self.assertEqual(sum(self.get_load()), 1)
+        self.assertEqual(recount_restaurants_load(), 0)
+
+    def test_recount_fixes_counters(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(
+            status=Order.Status.ASSEMBLY,
+            selected_restaurant=self.restaurants[1],
+        )
+        Restaurant.objects.filter(pk=self.restaurants[0].pk).update(active_orders_count=3)
+
+        self.assertEqual(recount_restaurants_load(), 2)
+        self.assertEqual(self.get_load(), [0, 1])
+
+    def test_saving_restaurant_keeps_counter(self):
+        Restaurant.objects.filter(pk=self.restaurants[0].pk).update(active_orders_count=3)
+
+        self.restaurants[0].name = 'Новое название'
+        self.restaurants[0].save()
+        self.assertEqual(self.get_load(), [3, 0])
+
+
+class ProductsPageCacheTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def get_page(self, **headers):
+        return self.client.get('/api/products/', {'limit': 2}, HTTP_ACCEPT='application/json', **headers)
+
+    def test_cached_page_is_not_modified(self):
+        response = self.get_page()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['results']), 2)
+
+        with self.assertNumQueries(0):
+            not_modified_response = self.get_page(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified_response.status_code, 304)
+        self.assertEqual(not_modified_response['ETag'], response['ETag'])
+
+    def test_changed_catalog_is_rendered_again(self):
+        etag = self.get_page()['ETag']
+
+        product = self.products[0]
+        product.price = 500
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        response = self.get_page(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ParseQualityValuesTest(SimpleTestCase):
+    def test_weights(self):
+        self.assertEqual(
+            parse_quality_values('application/json;q=0.5, Application/MsgPack, */*;q=0'),
+            {'application/json': 0.5, 'application/msgpack': 1.0, '*/*': 0.0},
+        )
+
+    def test_invalid_weight_is_zero(self):
+        self.assertEqual(parse_quality_values('gzip;q=high, br'), {'gzip': 0, 'br': 1.0})
+        self.assertEqual(parse_quality_values(''), {})
+
+
+@mock.patch('foodcartapp.renderers.get_renderers', lambda: (JSONRenderer(), MessagePackRenderer()))
+class SelectRendererTest(SimpleTestCase):
+    def select(self, accept: str):
+        return type(select_renderer(RequestFactory().get('/', HTTP_ACCEPT=accept)))
+
+    def test_first_renderer_by_default(self):
+        self.assertIs(self.select(''), JSONRenderer)
+        self.assertIs(self.select('*/*'), JSONRenderer)
+        self.assertIs(self.select('text/html'), JSONRenderer)
+
+    def test_weights(self):
+        self.assertIs(self.select('application/msgpack, */*;q=0.1'), MessagePackRenderer)
+        self.assertIs(self.select('application/json;q=0.5, application/x-msgpack;q=0.9'), MessagePackRenderer)
+        self.assertIs(self.select('application/*;q=0.2, application/json;q=0'), MessagePackRenderer)
@@ -1,15 +1,21 @@
-from django.http import JsonResponse
+from django.http import HttpResponse
 from django.templatetags.static import static
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 
 from rest_framework.generics import CreateAPIView
 
-from .models import Product, Order
+from .catalog import get_products_page_response
+from .forms import ProductsFilter
+from .models import Order
+from .renderers import render_response, select_renderer
 from .serializers import OrderSerializer
+from .snapshot import build_snapshot, get_current_snapshot, select_encoding
 
 
 def banners_list_api(request):
     # FIXME move data to db?
-    return JsonResponse([
+    return render_response(request, [
         {
             'title': 'Burger',
             'src': static('burger.jpg'),
@@ -25,38 +31,49 @@ def banners_list_api(request):
             'src': static('tasty.jpg'),
             'text': 'Food is incomplete without a tasty dessert',
         }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    ])
 
 
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
+    """
+    Whole catalog is served from precomputed snapshot without parameters.
+    Filtered page of catalog is returned with any of parameters: category, special_status, restaurant,
+    q (part of name), cursor, limit and fields (e.g. fields=id,name,price), it is cached once per catalog version.
+    Conditional requests are answered by 304 Not Modified.
+    """
+    renderer = select_renderer(request)
 
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    if any(field in request.GET for field in ProductsFilter.base_fields):
+        products_filter = ProductsFilter(request.GET)
+        if not products_filter.is_valid():
+            errors = {field: list(field_errors) for field, field_errors in products_filter.errors.items()}
+            return render_response(request, errors, renderer, status=400)
+
+        cached_response = get_products_page_response(renderer, products_filter.cleaned_data)
+        content, encoding = cached_response['content'], 'identity'
+        etag, last_modified = cached_response['etag'], cached_response['last_modified']
+    else:
+        snapshot = get_current_snapshot()
+        if snapshot is None or not snapshot.get_encodings(renderer.format):
+            build_snapshot()
+            snapshot = get_current_snapshot()
+
+        encoding = select_encoding(request.headers.get('Accept-Encoding', ''), snapshot.get_encodings(renderer.format))
+        content = snapshot.get_content(renderer.format, encoding)
+        etag, last_modified = snapshot.get_etag(renderer.format, encoding), snapshot.last_modified
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(content, content_type=renderer.media_type)
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # clients revalidate the catalog every time, it is cheap with ETag
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+    return response
 
 
 class OrderView(CreateAPIView):
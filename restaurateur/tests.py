@@ -1,3 +1,63 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+
+from foodcartapp.models import Order
+from restaurateur.views import decode_cursor, encode_cursor, filter_orders, get_orders_page, get_unprocessed_orders
+
+
+class OrdersCursorTest(TestCase):
+    def test_cursor_is_decoded(self):
+        order = Order(pk=42, created_at=timezone.now())
+        self.assertEqual(decode_cursor(encode_cursor(order)), (order.created_at, 42))
+
+    def test_invalid_cursor(self):
+        self.assertIsNone(decode_cursor('not a cursor'))
+        self.assertIsNone(decode_cursor(''))
+
+
+class OrdersPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Order.objects.bulk_create([
+            Order(first_name='Иван', last_name='Иванов', phone_number='+79291000000', address=f'Москва, {number}')
+            for number in range(11)
+        ])
+        # orders with equal created_at are ordered by pk
+        created_at = timezone.now()
+        for number, order in enumerate(Order.objects.order_by('pk')):
+            Order.objects.filter(pk=order.pk).update(created_at=created_at - timedelta(minutes=number // 3))
+        Order.objects.filter(pk=Order.objects.order_by('pk').first().pk).update(status=Order.Status.FINISHED)
+
+    def test_pages_cover_orders_once_in_order(self):
+        expected_pks = list(get_unprocessed_orders().values_list('pk', flat=True))
+
+        pks = []
+        cursor = None
+        while True:
+            orders, cursor = get_orders_page(get_unprocessed_orders(), cursor=cursor, page_size=4)
+            self.assertLessEqual(len(orders), 4)
+            pks.extend(order.pk for order in orders)
+            if cursor is None:
+                break
+
+        self.assertEqual(len(expected_pks), 10)
+        self.assertEqual(pks, expected_pks)
+
+    def test_last_full_page_has_no_next_cursor(self):
+        orders, cursor = get_orders_page(get_unprocessed_orders(), page_size=10)
+        self.assertEqual(len(orders), 10)
+        self.assertIsNone(cursor)
+
+    def test_filtered_orders_are_paged(self):
+        Order.objects.filter(pk__in=list(get_unprocessed_orders().values_list('pk', flat=True)[:3])).update(
+            status=Order.Status.ASSEMBLY,
+        )
+        orders = filter_orders(get_unprocessed_orders(), {'status': Order.Status.ASSEMBLY})
+
+        first_page, cursor = get_orders_page(orders, page_size=2)
+        second_page, next_cursor = get_orders_page(orders, cursor=cursor, page_size=2)
 
-# Create your tests here.
+        self.assertEqual([order.status for order in first_page + second_page], [Order.Status.ASSEMBLY] * 3)
+        self.assertIsNone(next_cursor)
@@ -1,16 +1,23 @@
-from collections import defaultdict
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 
+from asgiref.sync import sync_to_async
 from django import forms
+from django.conf import settings
+from django.db.models import Q
 from django.shortcuts import redirect, render
 from django.views import View
 from django.urls import reverse_lazy, reverse
 from django.contrib.auth.decorators import user_passes_test
+from django.contrib.auth.views import redirect_to_login
 
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
+from django.utils.dateparse import parse_datetime
 
-from foodcartapp.geo_tools import get_distances
-from foodcartapp.models import Product, Restaurant, Order
+from foodcartapp.candidates import get_orders_candidates, update_orders_candidates
+from foodcartapp.geo_tools import schedule_orders_geocoding, geocode_orders, geocode_orders_async, \
+    save_orders_coordinates
+from foodcartapp.models import Product, Restaurant, Order, OrderCandidateRestaurant
 
 
 class Login(forms.Form):
@@ -30,6 +37,31 @@ class Login(forms.Form):
     )
 
 
+class OrdersFilter(forms.Form):
+    status = forms.ChoiceField(
+        label='Статус', required=False,
+        choices=[('', 'Все')] + [
+            (status.value, status.label) for status in Order.Status
+            if status not in (Order.Status.FINISHED, Order.Status.CANCELED)
+        ],
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    payment_method = forms.ChoiceField(
+        label='Способ оплаты', required=False,
+        choices=[('', 'Все')] + [
+            (method.value, method.label) for method in Order.PaymentMethod
+            if method != Order.PaymentMethod.EMPTY
+        ],
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    restaurant = forms.ModelChoiceField(
+        label='Ресторан', required=False,
+        queryset=Restaurant.objects.order_by('name'),
+        empty_label='Все',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+
+
 class LoginView(View):
     def get(self, request, *args, **kwargs):
         form = Login()
@@ -92,31 +124,194 @@ def view_restaurants(request):
     })
 
 
-@user_passes_test(is_manager, login_url='restaurateur:login')
-def view_orders(request):
-    orders = Order.objects.with_cost().exclude(
+def get_unprocessed_orders():
+    return Order.objects.exclude(
         status__in=[Order.Status.FINISHED, Order.Status.CANCELED]
-    ).order_by('-created_at')
+    ).order_by('-created_at', '-pk')
 
-    appropriated_restaurants = Order.get_many_orders_appropriate_restaurants(orders)
 
-    mapped_restaurants = defaultdict(list)
+def set_orders_cost(orders):
+    """
+    Sum cost of orders of the page by one query. Cost is not annotated to the page query,
+    so the page is selected by index without grouping of all open orders.
+    :param orders: list of orders
+    """
+    costs = dict(Order.objects.with_cost().filter(pk__in=[order.pk for order in orders]).values_list('pk', 'cost'))
+    for order in orders:
+        order.cost = costs.get(order.pk)
 
-    for restaurant in appropriated_restaurants:
-        mapped_restaurants[restaurant.order_pk].append(restaurant)
 
-    order_items = [
+def encode_cursor(order) -> str:
+    return urlsafe_b64encode(f'{order.created_at.isoformat()},{order.pk}'.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """
+    :return: tuple (created_at, pk) of the last order of previous page or None, when cursor is invalid
+    """
+    try:
+        created_at, pk = urlsafe_b64decode(cursor.encode()).decode().split(',')
+        created_at, pk = parse_datetime(created_at), int(pk)
+    except ValueError:
+        return None
+
+    return (created_at, pk) if created_at else None
+
+
+def filter_orders(orders, filters: dict):
+    """
+    :param orders: QuerySet of orders
+    :param filters: cleaned data of OrdersFilter
+    """
+    if filters.get('status'):
+        orders = orders.filter(status=filters['status'])
+    if filters.get('payment_method'):
+        orders = orders.filter(payment_method=filters['payment_method'])
+    if filters.get('restaurant'):
+        # order is shown for the selected restaurant or for every restaurant which can prepare it
+        candidate_orders = OrderCandidateRestaurant.objects.filter(restaurant=filters['restaurant']).values('order')
+        orders = orders.filter(
+            Q(selected_restaurant=filters['restaurant'])
+            | Q(selected_restaurant__isnull=True, pk__in=candidate_orders)
+        )
+    return orders
+
+
+def get_orders_page(orders, cursor: str = None, page_size: int = None):
+    """
+    Keyset pagination by (created_at, pk): the page is selected by index, without counting of skipped orders.
+    :param orders: QuerySet of orders ordered by -created_at, -pk
+    :param cursor: cursor of the last order of previous page, the first page by default
+    :param page_size: count of orders on the page, settings.ORDER_BOARD_PAGE_SIZE by default
+    :return: tuple (list of orders, cursor of next page or None, when the page is the last one)
+    """
+    page_size = page_size or settings.ORDER_BOARD_PAGE_SIZE
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, pk = position
+        orders = orders.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+    orders = list(orders[:page_size + 1])
+    next_cursor = encode_cursor(orders[page_size - 1]) if len(orders) > page_size else None
+    return orders[:page_size], next_cursor
+
+
+def get_board_page(request):
+    """
+    :return: tuple (orders of the page, context with filter form and query strings of first and next pages)
+    """
+    filter_form = OrdersFilter(request.GET)
+    filters = filter_form.cleaned_data if filter_form.is_valid() else {}
+
+    orders, next_cursor = get_orders_page(
+        filter_orders(get_unprocessed_orders(), filters),
+        cursor=request.GET.get('after'),
+    )
+    set_orders_cost(orders)
+
+    query = request.GET.copy()
+    query.pop('after', None)
+    first_page_query = query.urlencode()
+
+    next_page_query = None
+    if next_cursor:
+        query['after'] = next_cursor
+        next_page_query = query.urlencode()
+
+    return orders, {
+        'filter_form': filter_form,
+        'first_page_query': first_page_query,
+        'next_page_query': next_page_query,
+        'is_first_page': 'after' not in request.GET,
+    }
+
+
+def get_not_geocoded_orders(orders):
+    return [
+        order for order in orders
+        if order.geocode_status in (Order.GeocodeStatus.PENDING, Order.GeocodeStatus.FAILED)
+    ]
+
+
+def save_geocoded_orders(orders, geocoded_orders):
+    """
+    Save coordinates of orders geocoded during render, orders which are still not geocoded are queued for background.
+    :param orders: orders which were not geocoded before render
+    :param geocoded_orders: orders which geocoding is finished or failed during render,
+        the other orders are not saved, they can be geocoded by background job meanwhile
+    """
+    save_orders_coordinates(geocoded_orders)
+    update_orders_candidates(
+        order.pk for order in geocoded_orders
+        if order.geocode_status in (Order.GeocodeStatus.FOUND, Order.GeocodeStatus.NOT_FOUND)
+    )
+
+    not_geocoded_orders = get_not_geocoded_orders(orders)
+    if not_geocoded_orders:
+        schedule_orders_geocoding(order.pk for order in not_geocoded_orders)
+
+
+def get_order_items(orders):
+    """
+    :param orders: list of orders
+    :return: list of dicts with order and its appropriate restaurants with distances
+    """
+    orders_distances = get_orders_candidates(
+        orders,
+        k=settings.ORDER_BOARD_RESTAURANTS_LIMIT,
+        radius_km=settings.ORDER_BOARD_RADIUS_KM,
+    )
+
+    return [
         {
             'order': order,
-            'restaurants': get_distances(order, mapped_restaurants.get(order.pk, []), sort=True)
+            'restaurants': orders_distances[order.pk]
         }
         for order in orders
     ]
 
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders(request):
+    # only orders of the visible page are geocoded and matched with restaurants
+    orders, page_context = get_board_page(request)
+
+    # orders are geocoded in background after creation, here only orders created before or failed are retried
+    not_geocoded_orders = get_not_geocoded_orders(orders)
+    if not_geocoded_orders:
+        geocoded_orders = geocode_orders(not_geocoded_orders, timeout=settings.ORDER_BOARD_GEOCODING_BUDGET)
+        save_geocoded_orders(not_geocoded_orders, geocoded_orders)
+
     context = {
-        'order_items': order_items,
+        'order_items': get_order_items(orders),
         'next': reverse('restaurateur:view_orders'),
-        'restaurants': Order.get_many_orders_appropriate_restaurants(orders)
+        **page_context,
     }
 
     return render(request, template_name='order_items.html', context=context)
+
+
+async def view_orders_async(request):
+    """
+    Async version of view_orders for ASGI server. Not geocoded orders are geocoded concurrently
+    while the request is waiting, and the worker is free to serve other requests meanwhile.
+    Django 3.2 has no async ORM, so queries are run by sync_to_async.
+    """
+    if not await sync_to_async(is_manager)(request.user):
+        return redirect_to_login(request.get_full_path(), reverse('restaurateur:login'))
+
+    orders, page_context = await sync_to_async(get_board_page)(request)
+
+    not_geocoded_orders = get_not_geocoded_orders(orders)
+    if not_geocoded_orders:
+        geocoded_orders = await geocode_orders_async(not_geocoded_orders, timeout=settings.ORDER_BOARD_GEOCODING_BUDGET)
+        await sync_to_async(save_geocoded_orders)(not_geocoded_orders, geocoded_orders)
+
+    context = {
+        'order_items': await sync_to_async(get_order_items)(orders),
+        'next': reverse('restaurateur:view_orders_async'),
+        **page_context,
+    }
+
+    return await sync_to_async(render)(request, template_name='order_items.html', context=context)
@@ -79,6 +79,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'star_burger.wsgi.application'
+ASGI_APPLICATION = 'star_burger.asgi.application'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
@@ -89,6 +90,12 @@ DATABASES = {
     )
 }
 
+# cache must be shared by all processes of the site, e.g. pymemcache://127.0.0.1:11211,
+# otherwise changes of the catalog are seen by other processes after CATALOG_CACHE_TIMEOUT only
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -127,3 +134,48 @@ STATICFILES_DIRS = [
 ]
 
 YANDEX_GEOCODER_API_KEY = env('YANDEX_GEOCODER_API_KEY')
+# foodcartapp.geocoders.StubGeocoder works offline, use it for development and load testing
+GEOCODER_BACKEND = env.str('GEOCODER_BACKEND', 'foodcartapp.geocoders.YandexGeocoder')
+GEOCODER_CONNECT_TIMEOUT = env.float('GEOCODER_CONNECT_TIMEOUT', 3.05)
+GEOCODER_READ_TIMEOUT = env.float('GEOCODER_READ_TIMEOUT', 5)
+GEOCODER_RETRIES = env.int('GEOCODER_RETRIES', 2)
+GEOCODER_BACKOFF_FACTOR = env.float('GEOCODER_BACKOFF_FACTOR', 0.3)
+GEOCODER_STUB_LATENCY = env.float('GEOCODER_STUB_LATENCY', 0)
+# other processes wait for result of geocoding of the same address this time in seconds
+GEOCODER_LOCK_TIMEOUT = env.float('GEOCODER_LOCK_TIMEOUT', 15)
+# geocoder is not called for cool-down period in seconds after this count of consecutive failures
+GEOCODER_CIRCUIT_MAX_FAILURES = env.int('GEOCODER_CIRCUIT_MAX_FAILURES', 5)
+GEOCODER_CIRCUIT_COOLDOWN = env.float('GEOCODER_CIRCUIT_COOLDOWN', 30)
+GEOCODER_MAX_WORKERS = env.int('GEOCODER_MAX_WORKERS', 8)
+GEOCODER_MEMORY_CACHE_SIZE = env.int('GEOCODER_MEMORY_CACHE_SIZE', 10000)
+GEOCODER_MEMORY_CACHE_TTL = env.float('GEOCODER_MEMORY_CACHE_TTL', 300)
+
+# haversine, equirectangular or geodesic, see foodcartapp/distance_matrix.py
+DISTANCE_METHOD = env.str('DISTANCE_METHOD', 'haversine')
+# store evaluated distances in cache_address_app.CachedDistance
+DISTANCE_CACHE_ENABLED = env.bool('DISTANCE_CACHE_ENABLED', True)
+
+RESTAURANTS_INDEX_CELL_KM = env.float('RESTAURANTS_INDEX_CELL_KM', 5)
+RESTAURANTS_INDEX_TTL = env.float('RESTAURANTS_INDEX_TTL', 60)
+AVAILABILITY_INDEX_TTL = env.float('AVAILABILITY_INDEX_TTL', 60)
+# show only this count of nearest restaurants within this radius on the order board, unlimited by default
+ORDER_BOARD_RESTAURANTS_LIMIT = env.int('ORDER_BOARD_RESTAURANTS_LIMIT', None)
+ORDER_BOARD_RADIUS_KM = env.float('ORDER_BOARD_RADIUS_KM', None)
+# max time in seconds spent on geocoding of orders during render of the order board, the rest is geocoded in background
+ORDER_BOARD_GEOCODING_BUDGET = env.float('ORDER_BOARD_GEOCODING_BUDGET', 0.5)
+ORDER_BOARD_PAGE_SIZE = env.int('ORDER_BOARD_PAGE_SIZE', 50)
+
+# renderers of API responses negotiated by Accept header, see foodcartapp/renderers.py
+API_RENDERERS = env.list('API_RENDERERS', [
+    'foodcartapp.renderers.FastJSONRenderer',
+    'foodcartapp.renderers.JSONRenderer',
+    'foodcartapp.renderers.MessagePackRenderer',
+])
+
+# rendered catalog and its snapshot are rebuilt after change of products, but not later than this in seconds
+CATALOG_CACHE_TIMEOUT = env.int('CATALOG_CACHE_TIMEOUT', 300)
+# precomputed snapshots of the whole catalog, see foodcartapp/snapshot.py
+CATALOG_SNAPSHOT_DIR = env.str('CATALOG_SNAPSHOT_DIR', os.path.join(BASE_DIR, 'catalog_snapshot'))
+# /api/products/ returns pages of this size, when it is filtered or paginated
+PRODUCTS_API_PAGE_SIZE = env.int('PRODUCTS_API_PAGE_SIZE', 50)
+PRODUCTS_API_MAX_PAGE_SIZE = env.int('PRODUCTS_API_MAX_PAGE_SIZE', 200)